@@ -1,5 +1,7 @@
 """
 ASGI config for Anonymous Messaging Platform
+
+Serves the async read endpoints (config/asgi_urls.py) and the live feed.
 """
 
 import os
@@ -7,5 +9,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ASGI_DEPLOYMENT', 'True')
 
 application = get_asgi_application()
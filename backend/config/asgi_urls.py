@@ -0,0 +1,18 @@
+"""
+URL configuration for the ASGI deployment: the live feed stream and async
+versions of the hot read paths, everything else routed as in config.urls
+"""
+from django.urls import path
+
+from posts import async_views
+from posts.views import LiveFeedView
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    # Streams only make sense here; before the router so 'live' is not a post id
+    path('api/posts/live/', LiveFeedView.as_view(), name='post-live'),
+    path('api/posts/', async_views.post_list, name='async-post-list'),
+    path('api/posts/<int:pk>/', async_views.post_detail, name='async-post-detail'),
+    path('api/topics/today/', async_views.topic_today, name='async-topic-today'),
+] + sync_urlpatterns
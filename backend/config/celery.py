@@ -4,6 +4,7 @@ Celery configuration for scheduled tasks
 import os
 from celery import Celery
 from celery.schedules import crontab
+from decouple import config
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -15,7 +16,21 @@ app.autodiscover_tasks()
 app.conf.beat_schedule = {
     'delete-old-posts-every-hour': {
         'task': 'posts.tasks.delete_old_posts',
-        'schedule': crontab(minute=0),  # Run every hour
+        # Run every hour; with partitioned posts this also creates and drops
+        # partitions, before its DELETEs rather than concurrently with them
+        'schedule': crontab(minute=0),
+    },
+    'flush-view-counts': {
+        'task': 'posts.tasks.flush_view_counts',
+        'schedule': config('VIEW_COUNT_FLUSH_SECONDS', default=10, cast=int),  # Bounds view staleness
+    },
+    'flush-like-buffer': {
+        'task': 'posts.tasks.flush_like_buffer',
+        'schedule': config('LIKE_FLUSH_SECONDS', default=5, cast=int),  # No-op unless LIKE_BUFFER is set
+    },
+    'purge-expired-sessions': {
+        'task': 'users.tasks.purge_expired_sessions',
+        'schedule': crontab(minute=30),  # Run every hour
     },
     'update-daily-topics': {
         'task': 'posts.tasks.update_daily_topic',
@@ -0,0 +1,111 @@
+"""
+Per-process database connection metrics.
+
+ConnectionMetricsMixin wraps a backend's DatabaseWrapper (see
+config/postgresql) and records, for each database alias, how many
+connections were opened and closed, how long they lived and how many
+request cycles reused an already-open connection instead of connecting.
+"""
+import threading
+import time
+
+
+class ConnectionMetrics:
+    """Thread-safe counters for the connections of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._open = {}
+
+    def _stats(self, alias):
+        stats = self._aliases.get(alias)
+        if stats is None:
+            stats = self._aliases[alias] = {
+                'opened': 0,
+                'closed': 0,
+                'reused': 0,
+                'lifetime_total': 0.0,
+                'lifetime_max': 0.0,
+            }
+        return stats
+
+    def opened(self, alias, key):
+        with self._lock:
+            self._stats(alias)['opened'] += 1
+            self._open[key] = (alias, time.monotonic())
+
+    def closed(self, key):
+        with self._lock:
+            entry = self._open.pop(key, None)
+            if entry is None:
+                return
+            alias, opened_at = entry
+            lifetime = time.monotonic() - opened_at
+            stats = self._stats(alias)
+            stats['closed'] += 1
+            stats['lifetime_total'] += lifetime
+            stats['lifetime_max'] = max(stats['lifetime_max'], lifetime)
+
+    def reused(self, alias):
+        with self._lock:
+            self._stats(alias)['reused'] += 1
+
+    def snapshot(self):
+        """Return {alias: metrics} for this process"""
+        now = time.monotonic()
+        with self._lock:
+            ages = {}
+            for alias, opened_at in self._open.values():
+                ages.setdefault(alias, []).append(now - opened_at)
+            result = {}
+            for alias, stats in self._aliases.items():
+                open_ages = ages.get(alias, [])
+                checkouts = stats['opened'] + stats['reused']
+                result[alias] = {
+                    'connections_opened': stats['opened'],
+                    'connections_closed': stats['closed'],
+                    'connections_open': len(open_ages),
+                    'connections_reused': stats['reused'],
+                    'reuse_ratio': round(stats['reused'] / checkouts, 4) if checkouts else 0.0,
+                    'lifetime_avg_seconds': (
+                        round(stats['lifetime_total'] / stats['closed'], 3) if stats['closed'] else 0.0
+                    ),
+                    'lifetime_max_seconds': round(stats['lifetime_max'], 3),
+                    'oldest_open_seconds': round(max(open_ages), 3) if open_ages else 0.0,
+                }
+            return result
+
+
+metrics = ConnectionMetrics()
+
+
+class ConnectionMetricsMixin:
+    """Record connection opens, closes and reuse for a DatabaseWrapper"""
+
+    # Whether the current request cycle has already been counted
+    _metrics_checked_out = False
+
+    def connect(self):
+        super().connect()
+        metrics.opened(self.alias, id(self))
+        self._metrics_checked_out = True
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            metrics.closed(id(self))
+
+    def _cursor(self, name=None):
+        cursor = super()._cursor(name)
+        if not self._metrics_checked_out:
+            # First query of a request cycle on a connection kept from before
+            self._metrics_checked_out = True
+            metrics.reused(self.alias)
+        return cursor
+
+    def close_if_unusable_or_obsolete(self):
+        # Called by Django at the start and end of every request
+        self._metrics_checked_out = False
+        super().close_if_unusable_or_obsolete()
@@ -0,0 +1,295 @@
+"""
+Per-request query and latency instrumentation.
+
+With REQUEST_METRICS on, request_metrics_middleware samples
+REQUEST_METRICS_SAMPLE_RATE of requests. For each sampled request it
+records the SQL queries and their time (through a database execute
+wrapper), the time spent in serializers (InstrumentedSerializerMixin) and
+the total time, labelled by URL name and viewset action. Sampled responses
+carry a Server-Timing header when REQUEST_METRICS_SERVER_TIMING is on, and
+the totals are aggregated for the Prometheus endpoint
+(config.views.prometheus_metrics): in one Redis hash shared by every worker
+(REQUEST_METRICS_STORE = 'redis') or per process ('memory').
+"""
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+
+import redis
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# KEYS: metrics hash. ARGV: series, duration, bucket index ('' past the last
+# bound), queries, db_time, serializer_time, serializer_queries. Fields are
+# '<series>|<total>'; one script so that queries_max is updated atomically.
+OBSERVE_SCRIPT = """
+local series = ARGV[1] .. '|'
+redis.call('HINCRBY', KEYS[1], series .. 'count', 1)
+redis.call('HINCRBYFLOAT', KEYS[1], series .. 'duration', ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('HINCRBY', KEYS[1], series .. 'bucket:' .. ARGV[3], 1)
+end
+redis.call('HINCRBY', KEYS[1], series .. 'queries', ARGV[4])
+local queries_max = tonumber(redis.call('HGET', KEYS[1], series .. 'queries_max') or '0')
+if tonumber(ARGV[4]) > queries_max then
+    redis.call('HSET', KEYS[1], series .. 'queries_max', ARGV[4])
+end
+redis.call('HINCRBYFLOAT', KEYS[1], series .. 'db_time', ARGV[5])
+redis.call('HINCRBYFLOAT', KEYS[1], series .. 'serializer_time', ARGV[6])
+redis.call('HINCRBY', KEYS[1], series .. 'serializer_queries', ARGV[7])
+"""
+
+
+class _Sample:
+    """Measurements of the sampled request being served"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        # Queries run while serializing, where N+1 patterns show up
+        self.serializer_queries = 0
+        # Threads inside a top-level serializer: a query counts as a
+        # serializer query only if its own thread is serializing
+        self.serializing = set()
+        # The sample is shared by every thread the request's context is
+        # copied to (under ASGI, sync code runs in executor threads)
+        self.lock = threading.Lock()
+
+    def begin_serializing(self):
+        """Mark this thread as serializing; False if it already was (a nested serializer)"""
+        thread = threading.get_ident()
+        with self.lock:
+            if thread in self.serializing:
+                return False
+            self.serializing.add(thread)
+            return True
+
+    def end_serializing(self, elapsed):
+        with self.lock:
+            self.serializer_time += elapsed
+            self.serializing.discard(threading.get_ident())
+
+
+_sample = contextvars.ContextVar('request_metrics_sample', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper that times queries made for a sampled request"""
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        with sample.lock:
+            sample.queries += 1
+            sample.db_time += elapsed
+            if threading.get_ident() in sample.serializing:
+                sample.serializer_queries += 1
+
+
+def _install_wrapper(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        # First, so that connection.execute_wrapper() blocks pop their own
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class InstrumentedSerializerMixin:
+    """Count the time a top-level serializer spends serializing towards the sampled request"""
+
+    def to_representation(self, instance):
+        sample = _sample.get()
+        if sample is None or not sample.begin_serializing():
+            return super().to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            sample.end_serializing(time.perf_counter() - started)
+
+
+def _bucket(duration):
+    """Index of the first DURATION_BUCKETS bound duration fits under, or None"""
+    for index, bound in enumerate(DURATION_BUCKETS):
+        if duration <= bound:
+            return index
+    return None
+
+
+def _empty_totals():
+    return {
+        'count': 0,
+        'duration': 0.0,
+        'buckets': [0] * len(DURATION_BUCKETS),
+        'queries': 0,
+        'queries_max': 0,
+        'db_time': 0.0,
+        'serializer_time': 0.0,
+        'serializer_queries': 0,
+    }
+
+
+class RequestMetrics:
+    """Thread-safe per-process totals of sampled requests, by view, action, method and status class"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, sample, duration):
+        bucket = _bucket(duration)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _empty_totals()
+            series['count'] += 1
+            series['duration'] += duration
+            if bucket is not None:
+                series['buckets'][bucket] += 1
+            series['queries'] += sample.queries
+            series['queries_max'] = max(series['queries_max'], sample.queries)
+            series['db_time'] += sample.db_time
+            series['serializer_time'] += sample.serializer_time
+            series['serializer_queries'] += sample.serializer_queries
+
+    def snapshot(self):
+        """Return {(view, action, method, status): totals}"""
+        with self._lock:
+            return {
+                labels: {**series, 'buckets': list(series['buckets'])}
+                for labels, series in self._series.items()
+            }
+
+
+class RedisRequestMetrics:
+    """
+    Totals of sampled requests across every worker, kept in one Redis hash
+    and updated with a single script call per sampled request
+    """
+
+    def __init__(self, url, key):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self._observe = self.client.register_script(OBSERVE_SCRIPT)
+
+    def observe(self, labels, sample, duration):
+        bucket = _bucket(duration)
+        try:
+            self._observe(keys=[self.key], args=[
+                json.dumps(labels),
+                repr(duration),
+                '' if bucket is None else bucket,
+                sample.queries,
+                repr(sample.db_time),
+                repr(sample.serializer_time),
+                sample.serializer_queries,
+            ])
+        except redis.RedisError:
+            # Metrics are best effort; never fail the request they describe
+            logger.warning('Could not record request metrics', exc_info=True)
+
+    def snapshot(self):
+        """Return {(view, action, method, status): totals}"""
+        result = {}
+        for field, value in self.client.hgetall(self.key).items():
+            series, name = field.decode().rsplit('|', 1)
+            totals = result.setdefault(tuple(json.loads(series)), _empty_totals())
+            if name.startswith('bucket:'):
+                index = int(name[len('bucket:'):])
+                if index < len(DURATION_BUCKETS):
+                    totals['buckets'][index] += int(value)
+            elif name in totals:
+                totals[name] = type(totals[name])(value.decode())
+        return result
+
+
+_request_metrics = None
+_request_metrics_lock = threading.Lock()
+
+
+def get_request_metrics():
+    """Return the process-wide request metrics store configured in settings"""
+    global _request_metrics
+    if _request_metrics is None:
+        with _request_metrics_lock:
+            if _request_metrics is None:
+                if settings.REQUEST_METRICS_STORE == 'redis':
+                    _request_metrics = RedisRequestMetrics(settings.REDIS_URL, settings.REQUEST_METRICS_KEY)
+                else:
+                    _request_metrics = RequestMetrics()
+    return _request_metrics
+
+
+def _labels(request, response):
+    match = request.resolver_match
+    method = request.method.lower()
+    if match is None:
+        view, action = 'unmatched', method
+    else:
+        # Viewset views map methods to actions ('get' -> 'list')
+        actions = getattr(match.func, 'actions', None) or {}
+        view, action = match.view_name or match._func_path, actions.get(method, method)
+    return view, action, request.method, f'{response.status_code // 100}xx'
+
+
+def _begin():
+    if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+        return None, None, None
+    sample = _Sample()
+    return sample, _sample.set(sample), time.perf_counter()
+
+
+def _finish(request, response, sample, started):
+    duration = time.perf_counter() - started
+    get_request_metrics().observe(_labels(request, response), sample, duration)
+    if settings.REQUEST_METRICS_SERVER_TIMING:
+        response['Server-Timing'] = (
+            f'db;dur={sample.db_time * 1000:.2f};desc="{sample.queries} queries", '
+            f'serializer;dur={sample.serializer_time * 1000:.2f}, '
+            f'total;dur={duration * 1000:.2f}'
+        )
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Record query count, DB, serializer and total time of sampled requests"""
+    connection_created.connect(_install_wrapper, dispatch_uid='request_metrics')
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            sample, token, started = _begin()
+            if sample is None:
+                return await get_response(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _sample.reset(token)
+            return _finish(request, response, sample, started)
+    else:
+        def middleware(request):
+            sample, token, started = _begin()
+            if sample is None:
+                return get_response(request)
+            try:
+                response = get_response(request)
+            finally:
+                _sample.reset(token)
+            return _finish(request, response, sample, started)
+    return middleware
@@ -0,0 +1,10 @@
+"""
+PostgreSQL backend with connection lifetime metrics (config/db_metrics.py)
+"""
+from django.db.backends.postgresql import base
+
+from config.db_metrics import ConnectionMetricsMixin
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, base.DatabaseWrapper):
+    pass
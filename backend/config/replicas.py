@@ -0,0 +1,173 @@
+"""
+Read-replica routing.
+
+Reads made while serving a GET/HEAD/OPTIONS request go to a streaming
+replica (DB_REPLICA_HOSTS); everything else - writes, reads in write
+requests or transactions, Celery tasks and management commands - uses the
+primary. Replicas are skipped while their replay lag exceeds
+DB_REPLICA_MAX_LAG_SECONDS, and a client that just wrote is pinned to the
+primary for DB_REPLICA_STICKY_SECONDS so it reads its own writes.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Zero when the replica has replayed everything it received (an idle
+# primary would otherwise look like growing lag)
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class _RoutingState:
+    """Routing decisions for the request being served"""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+_lag = {}
+_lag_lock = threading.Lock()
+
+
+def _measure_lag(alias):
+    """Replay lag of alias in seconds, or None when it cannot be reached"""
+    connection = connections[alias]
+    try:
+        if connection.vendor != 'postgresql':
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning('Replica %s is unavailable', alias, exc_info=True)
+        connection.close()
+        return None
+
+
+def replica_lag(alias):
+    """Cached replay lag of alias, re-measured every DB_REPLICA_LAG_CHECK_SECONDS"""
+    now = time.monotonic()
+    with _lag_lock:
+        checked_at, lag = _lag.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < settings.DB_REPLICA_LAG_CHECK_SECONDS:
+            return lag
+        # Claim the check so concurrent threads keep using the last value
+        _lag[alias] = (now, lag)
+    lag = _measure_lag(alias)
+    with _lag_lock:
+        _lag[alias] = (now, lag)
+    return lag
+
+
+def lag_snapshot():
+    """Return {alias: last measured lag in seconds or None}"""
+    with _lag_lock:
+        return {alias: lag for alias, (_, lag) in _lag.items()}
+
+
+def choose_replica():
+    """A replica within the lag threshold, or the primary when none is"""
+    aliases = replica_aliases()
+    random.shuffle(aliases)
+    for alias in aliases:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.DB_REPLICA_MAX_LAG_SECONDS:
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+class PrimaryReplicaRouter:
+    """Send safe request reads to a replica and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # One replica per request keeps its reads mutually consistent
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Later reads in this request must see this write
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _begin(request):
+    use_replica = request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES
+    return _state.set(_RoutingState(use_replica))
+
+
+def _finish(token, response):
+    state = _state.get()
+    _state.reset(token)
+    if state.wrote:
+        response.set_cookie(
+            STICKY_COOKIE, '1',
+            max_age=settings.DB_REPLICA_STICKY_SECONDS,
+            httponly=True,
+            samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """Scope replica routing to the request and pin writers to the primary"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _begin(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _state.reset(token)
+                raise
+            return _finish(token, response)
+    else:
+        def middleware(request):
+            token = _begin(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                _state.reset(token)
+                raise
+            return _finish(token, response)
+    return middleware
@@ -37,6 +37,9 @@ INSTALLED_APPS = [
     'moderation',
 ]
 
+# Set by config/asgi.py: route hot reads to async views (config/asgi_urls.py)
+ASGI_DEPLOYMENT = config('ASGI_DEPLOYMENT', default=False, cast=bool)
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -49,7 +52,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'config.urls'
+if ASGI_DEPLOYMENT:
+    # API only: WhiteNoise is sync-only and would push every request onto a thread
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+ROOT_URLCONF = 'config.asgi_urls' if ASGI_DEPLOYMENT else 'config.urls'
 
 TEMPLATES = [
     {
@@ -70,17 +77,79 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
+# DB_CONNECTION_MODE chooses how connections are managed:
+#   request    - connect and disconnect on every request (Django's default)
+#   persistent - each worker keeps its connection for DB_CONN_MAX_AGE seconds
+#                and checks it is alive before reusing it
+#   pgbouncer  - DB_HOST/DB_PORT point at pgbouncer in transaction pooling
+#                mode, which shares a small set of server connections
+DB_CONNECTION_MODE = config('DB_CONNECTION_MODE', default='persistent')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # PostgreSQL with connection lifetime metrics (config/db_metrics.py)
+        'ENGINE': 'config.postgresql',
         'NAME': config('DB_NAME', default='anonymous_posts_db'),
         'USER': config('DB_USER', default='postgres'),
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE if DB_CONNECTION_MODE in ('persistent', 'pgbouncer') else 0,
+        'CONN_HEALTH_CHECKS': DB_CONNECTION_MODE in ('persistent', 'pgbouncer'),
+        # Server-side cursors (.iterator()) cannot outlive the transaction
+        # pgbouncer pinned them to
+        'DISABLE_SERVER_SIDE_CURSORS': DB_CONNECTION_MODE == 'pgbouncer',
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+        },
     }
 }
 
+if ASGI_DEPLOYMENT:
+    # Requests under ASGI run on short-lived threads, so a kept connection
+    # would be orphaned with its thread; use pgbouncer to pool instead
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Read replicas (config/replicas.py): comma-separated host[:port] list of
+# streaming replicas of DB_HOST. Safe request reads go to a replica whose
+# lag is within DB_REPLICA_MAX_LAG_SECONDS; a client that wrote reads from
+# the primary for DB_REPLICA_STICKY_SECONDS.
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='', cast=Csv())
+DB_REPLICA_MAX_LAG_SECONDS = config('DB_REPLICA_MAX_LAG_SECONDS', default=2, cast=float)
+DB_REPLICA_LAG_CHECK_SECONDS = config('DB_REPLICA_LAG_CHECK_SECONDS', default=5, cast=float)
+DB_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+for index, replica_host in enumerate(DB_REPLICA_HOSTS):
+    replica_hostname, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_hostname,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        # Tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+
+if DB_REPLICA_HOSTS:
+    DATABASE_ROUTERS = ['config.replicas.PrimaryReplicaRouter']
+    MIDDLEWARE.insert(1, 'config.replicas.replica_routing_middleware')
+
+# Per-request instrumentation (config/instrumentation.py): query count, DB,
+# serializer and total time of REQUEST_METRICS_SAMPLE_RATE of requests,
+# per view and action, aggregated at GET /api/metrics/ (staff or
+# 'Authorization: Bearer METRICS_TOKEN')
+REQUEST_METRICS = config('REQUEST_METRICS', default=False, cast=bool)
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=0.1, cast=float)
+REQUEST_METRICS_SERVER_TIMING = config('REQUEST_METRICS_SERVER_TIMING', default=DEBUG, cast=bool)  # Server-Timing header on sampled responses
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Where the totals are kept: 'redis' (one hash shared by every worker) or 'memory' (per process)
+REQUEST_METRICS_STORE = config('REQUEST_METRICS_STORE', default='redis')
+REQUEST_METRICS_KEY = 'metrics:requests'
+
+if REQUEST_METRICS:
+    # Outermost, so total time covers every other middleware
+    MIDDLEWARE.insert(0, 'config.instrumentation.request_metrics_middleware')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -132,10 +201,11 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/hour',
-        'user': '1000/hour',
+        'anon': config('ANON_THROTTLE_RATE', default='100/hour'),
+        'user': config('USER_THROTTLE_RATE', default='1000/hour'),
         'post_create': '10/hour',
         'like': '100/hour',
+        'live': config('LIVE_THROTTLE_RATE', default='60/hour'),  # Live feed connections
     }
 }
 
@@ -147,6 +217,22 @@ CORS_ALLOWED_ORIGINS = config(
 )
 CORS_ALLOW_CREDENTIALS = True
 
+# Sessions: db, cached_db (Redis cache in front of the database), cache
+# (Redis only; sessions are lost if it is flushed) or signed_cookies (no
+# server-side storage; logout cannot revoke a copied cookie)
+SESSION_BACKEND = config('SESSION_BACKEND', default='cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+SESSION_PURGE_BATCH_SIZE = config('SESSION_PURGE_BATCH_SIZE', default=5000, cast=int)
+
+# The session user is cached for USER_CACHE_SECONDS (0 loads it every request)
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    # Sessions created before the cached backend still name this one; logins
+    # never reach it (CachedModelBackend.authenticate)
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_SECONDS = config('USER_CACHE_SECONDS', default=60, cast=int)
+
 # Security settings
 SESSION_COOKIE_SECURE = config('SESSION_COOKIE_SECURE', default=False, cast=bool)
 CSRF_COOKIE_SECURE = config('CSRF_COOKIE_SECURE', default=False, cast=bool)
@@ -155,14 +241,87 @@ SECURE_HSTS_SECONDS = config('SECURE_HSTS_SECONDS', default=0, cast=int)
 SECURE_HSTS_INCLUDE_SUBDOMAINS = config('SECURE_HSTS_INCLUDE_SUBDOMAINS', default=False, cast=bool)
 SECURE_HSTS_PRELOAD = config('SECURE_HSTS_PRELOAD', default=False, cast=bool)
 
+# Redis
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+
+# Cache (shared by throttling and read-path caches across all workers/replicas)
+CACHE_BACKEND = config('CACHE_BACKEND', default='redis')  # 'redis' or 'locmem'
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('CACHE_REDIS_URL', default=REDIS_URL),
+            'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='anon24'),
+            'VERSION': config('CACHE_VERSION', default=1, cast=int),
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                # Passed to the redis-py connection pool shared by each process
+                'max_connections': config('CACHE_MAX_CONNECTIONS', default=50, cast=int),
+                'socket_connect_timeout': 1,
+                'socket_timeout': 1,
+                'health_check_interval': 30,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery Configuration
-CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
 # Custom settings for the anonymous platform
+TOPIC_CACHE_SECONDS = 300  # Today's topic is cached and invalidated on change
+# Shared feed pages and post details; writes invalidate, so this only bounds view-count staleness
+FEED_CACHE_SECONDS = config('FEED_CACHE_SECONDS', default=30, cast=int)
+COMMENTS_PAGE_SIZE = config('COMMENTS_PAGE_SIZE', default=20, cast=int)  # Comments embedded in a post detail
 POST_DELETION_HOURS = 24  # Auto-delete posts after 24 hours
 USER_DELETE_WINDOW_HOURS = 24  # Users can delete their posts within 24 hours
+# Optional PostgreSQL range partitioning of posts by timestamp ('hour' or 'day');
+# existing tables are converted with manage.py partition_posts
+POST_PARTITIONING = config('POST_PARTITIONING', default=False, cast=bool)
+POST_PARTITION_INTERVAL = config('POST_PARTITION_INTERVAL', default='hour')
+POST_PARTITIONS_AHEAD = config('POST_PARTITIONS_AHEAD', default=24, cast=int)  # Future partitions kept ready
+POST_EXPIRY_BATCH_SIZE = config('POST_EXPIRY_BATCH_SIZE', default=1000, cast=int)  # Posts per expiry transaction
+# Hide a post from the feed once its unreviewed reports reach either
+# threshold (0 disables it); the score weighs each report by its reason
+AUTO_HIDE_REPORT_COUNT = config('AUTO_HIDE_REPORT_COUNT', default=10, cast=int)
+AUTO_HIDE_REPORT_SCORE = config('AUTO_HIDE_REPORT_SCORE', default=15, cast=int)
+REPORT_REASON_WEIGHTS = {
+    'spam': 1,
+    'harassment': 2,
+    'hate_speech': 3,
+    'violence': 3,
+    'self_harm': 3,
+    'other': 1,
+}
+
+# Compiled FilteredWord matcher is rebuilt on change or after this many seconds
+CONTENT_FILTER_TTL_SECONDS = config('CONTENT_FILTER_TTL_SECONDS', default=60, cast=int)
+
+# Post view counts are buffered and flushed in batches: 'redis' (drained by
+# the flush_view_counts task) or 'memory' (a thread in each web process)
+VIEW_COUNT_BUFFER = config('VIEW_COUNT_BUFFER', default='redis')
+VIEW_COUNT_BUFFER_KEY = 'posts:views'
+VIEW_COUNT_FLUSH_SECONDS = config('VIEW_COUNT_FLUSH_SECONDS', default=10, cast=int)
+
+# Optional write-behind likes for viral posts ('' writes directly, 'redis' or 'memory' buffers)
+LIKE_BUFFER = config('LIKE_BUFFER', default='')
+LIKE_BUFFER_KEY = 'posts:likes'
+LIKE_FLUSH_SECONDS = config('LIKE_FLUSH_SECONDS', default=5, cast=int)
+
+# Server-sent-event live feed (GET /api/posts/live/, served from config/asgi.py)
+LIVE_FEED = config('LIVE_FEED', default=True, cast=bool)  # Publish post/comment/like events
+LIVE_FEED_CHANNEL = 'posts:live'
+LIVE_FEED_CLIENT_BUFFER = 100  # Frames queued per client before the oldest is dropped
+LIVE_FEED_HEARTBEAT_SECONDS = 15
+LIVE_FEED_MAX_SECONDS = config('LIVE_FEED_MAX_SECONDS', default=300, cast=int)  # Clients reconnect after this
+LIVE_FEED_RETRY_MS = 3000
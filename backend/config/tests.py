@@ -0,0 +1,60 @@
+"""
+Tests for request instrumentation
+"""
+import contextvars
+import threading
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TestCase
+
+from .instrumentation import RedisRequestMetrics, _Sample, _sample, record_query
+
+User = get_user_model()
+
+
+class RequestMetricsTests(TestCase):
+    """Sampled request totals"""
+
+    def test_redis_totals_add_up_across_workers(self):
+        key = f'test:metrics:{uuid.uuid4().hex}'
+        # One store per worker process, sharing the hash
+        workers = [RedisRequestMetrics(settings.REDIS_URL, key) for _ in range(2)]
+        self.addCleanup(workers[0].client.delete, key)
+        labels = ('post-list', 'list', 'GET', '2xx')
+        for queries, worker in enumerate(workers, start=2):
+            sample = _Sample()
+            sample.queries, sample.db_time = queries, 0.001
+            worker.observe(labels, sample, 0.02)
+
+        totals = workers[1].snapshot()[labels]
+        self.assertEqual((totals['count'], totals['queries'], totals['queries_max']), (2, 5, 3))
+        self.assertAlmostEqual(totals['db_time'], 0.002)
+        self.assertEqual(totals['buckets'][2], 2)
+
+    def test_queries_on_other_threads_are_not_serializer_queries(self):
+        sample = _Sample()
+        token = _sample.set(sample)
+        self.addCleanup(_sample.reset, token)
+
+        def query():
+            with connection.execute_wrapper(record_query):
+                User.objects.count()
+
+        def query_and_close():
+            try:
+                query()
+            finally:
+                connections.close_all()
+
+        self.assertTrue(sample.begin_serializing())
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(query_and_close,))
+        thread.start()
+        thread.join()
+        query()
+        sample.end_serializing(0.0)
+
+        self.assertEqual((sample.queries, sample.serializer_queries), (2, 1))
+        self.assertFalse(sample.serializing)
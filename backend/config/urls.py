@@ -4,9 +4,13 @@ URL configuration for Anonymous Messaging Platform
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import DatabaseMetricsView, prometheus_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
     path('api/', include('posts.urls')),
     path('api/moderation/', include('moderation.urls')),
+    path('api/metrics/db/', DatabaseMetricsView.as_view(), name='db-metrics'),
+    path('api/metrics/', prometheus_metrics, name='metrics'),
 ]
@@ -0,0 +1,107 @@
+"""
+Operational endpoints for staff
+"""
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .db_metrics import metrics
+from .instrumentation import DURATION_BUCKETS, get_request_metrics
+from .replicas import lag_snapshot
+
+
+class DatabaseMetricsView(APIView):
+    """Connection lifetime metrics of the worker process serving the request"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'mode': settings.DB_CONNECTION_MODE,
+            'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+            'databases': metrics.snapshot(),
+            'replica_lag_seconds': lag_snapshot(),
+        })
+
+
+def _label_string(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _request_lines():
+    series = get_request_metrics().snapshot()
+    lines = [
+        '# HELP api_request_sample_rate Share of requests that are instrumented',
+        '# TYPE api_request_sample_rate gauge',
+        f'api_request_sample_rate {settings.REQUEST_METRICS_SAMPLE_RATE if settings.REQUEST_METRICS else 0}',
+        '# HELP api_request_duration_seconds Total time of sampled requests',
+        '# TYPE api_request_duration_seconds histogram',
+    ]
+    for (view, action, method, status), totals in series.items():
+        labels = {'view': view, 'action': action, 'method': method, 'status': status}
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, totals['buckets']):
+            cumulative += count
+            lines.append(f'api_request_duration_seconds_bucket{_label_string(**labels, le=bound)} {cumulative}')
+        lines.append(f'api_request_duration_seconds_bucket{_label_string(**labels, le="+Inf")} {totals["count"]}')
+        lines.append(f'api_request_duration_seconds_sum{_label_string(**labels)} {totals["duration"]:.6f}')
+        lines.append(f'api_request_duration_seconds_count{_label_string(**labels)} {totals["count"]}')
+
+    for name, key, kind, help_text in (
+        ('api_request_db_queries_total', 'queries', 'counter', 'SQL queries run by sampled requests'),
+        ('api_request_db_queries_max', 'queries_max', 'gauge', 'Most SQL queries run by one sampled request'),
+        ('api_request_db_seconds_total', 'db_time', 'counter', 'Time sampled requests spent in SQL'),
+        ('api_request_serializer_seconds_total', 'serializer_time', 'counter', 'Time sampled requests spent serializing'),
+        ('api_request_serializer_queries_total', 'serializer_queries', 'counter',
+         'SQL queries run while serializing (N+1 candidates)'),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (view, action, method, status), totals in series.items():
+            labels = _label_string(view=view, action=action, method=method, status=status)
+            value = totals[key]
+            lines.append(f'{name}{labels} {value:.6f}' if isinstance(value, float) else f'{name}{labels} {value}')
+    return lines
+
+
+def _database_lines():
+    connections = metrics.snapshot()
+    lines = []
+    for name, key, kind, help_text in (
+        ('db_connections_opened_total', 'connections_opened', 'counter', 'Database connections opened'),
+        ('db_connections_closed_total', 'connections_closed', 'counter', 'Database connections closed'),
+        ('db_connections_reused_total', 'connections_reused', 'counter',
+         'Request cycles served on an already open connection'),
+        ('db_connections_open', 'connections_open', 'gauge', 'Database connections open now'),
+        ('db_connection_lifetime_max_seconds', 'lifetime_max_seconds', 'gauge', 'Longest connection lifetime'),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, stats in connections.items():
+            lines.append(f'{name}{_label_string(alias=alias)} {stats[key]}')
+
+    lines.append('# HELP db_replica_lag_seconds Last measured replay lag of each replica')
+    lines.append('# TYPE db_replica_lag_seconds gauge')
+    for alias, lag in lag_snapshot().items():
+        if lag is not None:
+            lines.append(f'db_replica_lag_seconds{_label_string(alias=alias)} {lag}')
+    return lines
+
+
+def prometheus_metrics(request):
+    """
+    Request metrics (of every worker with REQUEST_METRICS_STORE = 'redis')
+    and the connection metrics of the worker process serving the request,
+    in the Prometheus text format. Open to staff sessions and to
+    scrapers sending 'Authorization: Bearer <METRICS_TOKEN>'.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or (token and constant_time_compare(authorization, f'Bearer {token}'))):
+        return HttpResponseForbidden()
+    body = '\n'.join(_request_lines() + _database_lines()) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status', '-timestamp'], name='reports_status_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+
+
+def backfill_report_totals(apps, schema_editor):
+    """Seed report_count/report_score from pending reports and apply auto-hide"""
+    Post = apps.get_model('posts', 'Post')
+    Report = apps.get_model('moderation', 'Report')
+    
+    pending = Report.objects.filter(
+        status='pending', post=OuterRef('pk')
+    ).order_by().values('post')
+    weight = Case(
+        *[When(reason=reason, then=Value(w)) for reason, w in settings.REPORT_REASON_WEIGHTS.items()],
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    Post.objects.filter(
+        pk__in=Report.objects.filter(status='pending').values('post')
+    ).update(
+        report_count=Subquery(pending.annotate(total=Count('id')).values('total')),
+        report_score=Subquery(pending.annotate(total=Sum(weight)).values('total')),
+    )
+    
+    conditions = Q(pk__in=[])
+    if settings.AUTO_HIDE_REPORT_COUNT:
+        conditions |= Q(report_count__gte=settings.AUTO_HIDE_REPORT_COUNT)
+    if settings.AUTO_HIDE_REPORT_SCORE:
+        conditions |= Q(report_score__gte=settings.AUTO_HIDE_REPORT_SCORE)
+    Post.objects.filter(conditions).update(is_hidden=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0004_report_status_timestamp_idx'),
+        ('posts', '0005_post_auto_hide'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_report_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_post_timestamps(apps, schema_editor):
+    """Copy each report's post timestamp into post_timestamp"""
+    Post = apps.get_model('posts', 'Post')
+    Report = apps.get_model('moderation', 'Report')
+    
+    Report.objects.update(
+        post_timestamp=Subquery(
+            Post.objects.filter(pk=OuterRef('post_id')).values('timestamp')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_like_post_timestamp'),
+        ('moderation', '0005_backfill_post_report_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='post_timestamp',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_post_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='report',
+            name='post_timestamp',
+            field=models.DateTimeField(editable=False),
+        ),
+        # The existing foreign key stays in the database; partitioning
+        # replaces it with one on (post_id, post_timestamp)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='report',
+                    name='post',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='posts.post'),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='report',
+            unique_together={('post', 'reporter', 'post_timestamp')},
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_latest_report_at(apps, schema_editor):
+    """Seed latest_report_at from the pending reports counted in report_count"""
+    Post = apps.get_model('posts', 'Post')
+    Report = apps.get_model('moderation', 'Report')
+    
+    latest = Report.objects.filter(
+        status='pending', post=OuterRef('pk')
+    ).order_by().values('post').annotate(latest=Max('timestamp')).values('latest')
+    Post.objects.filter(
+        pk__in=Report.objects.filter(status='pending').values('post')
+    ).update(latest_report_at=Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderation', '0006_report_post_timestamp'),
+        ('posts', '0008_post_latest_report_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_latest_report_at, migrations.RunPython.noop),
+    ]
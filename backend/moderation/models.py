@@ -2,10 +2,33 @@
 Models for content moderation and reporting
 """
 from django.db import models
+from django.db.models import Count, Max, Min, Q
 from django.conf import settings
 from posts.models import Post
 
 
+class ReportQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(status='pending')
+
+    def grouped_by_post(self):
+        """
+        One row per reported post: {'post', 'report_count', 'reasons_<key>'
+        per reason, 'first_report_at', 'latest_report_at'}, aggregated in a
+        single GROUP BY. Filter to a page of posts first: the moderation
+        queue pages over Post.objects.reported(), not over these rows.
+        """
+        return self.order_by().values('post').annotate(
+            report_count=Count('id'),
+            first_report_at=Min('timestamp'),
+            latest_report_at=Max('timestamp'),
+            **{
+                f'reasons_{reason}': Count('id', filter=Q(reason=reason))
+                for reason, _ in Report.REASON_CHOICES
+            },
+        )
+
+
 class Report(models.Model):
     """Model for reporting inappropriate posts/comments"""
     
@@ -26,11 +49,16 @@ class Report(models.Model):
         ('dismissed', 'Dismissed'),
     ]
     
+    # The database foreign key is maintained by migrations and, once posts
+    # are partitioned, references (post_id, post_timestamp)
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='reports'
     )
+    # Copy of post.timestamp: reports are partitioned along with their post
+    post_timestamp = models.DateTimeField(editable=False)
     reporter = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -54,11 +82,23 @@ class Report(models.Model):
         related_name='reports_reviewed'
     )
     
+    objects = ReportQuerySet.as_manager()
+    
     class Meta:
         db_table = 'reports'
         ordering = ['-timestamp']
         # Prevent duplicate reports from same user for same post
-        unique_together = ['post', 'reporter']
+        unique_together = ['post', 'reporter', 'post_timestamp']
+        indexes = [
+            # Moderation queue: pending reports, newest first
+            models.Index(fields=['status', '-timestamp'], name='reports_status_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"Report #{self.id} - {self.reason} on {self.post.uuid}"
+    
+    def save(self, *args, **kwargs):
+        """Copy the post's timestamp when the report is first saved"""
+        if self.post_timestamp is None:
+            self.post_timestamp = self.post.timestamp
+        super().save(*args, **kwargs)
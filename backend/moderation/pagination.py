@@ -0,0 +1,16 @@
+"""
+Pagination classes for the moderation queue
+"""
+from posts.pagination import PostCursorPagination
+
+
+class ReportQueuePagination(PostCursorPagination):
+    """
+    Keyset pagination over reported posts (Post.objects.reported()), most
+    recently reported first: a range scan of posts_reported_idx, whose
+    positions stay put when other posts are reported
+    """
+    page_size = 50
+    max_page_size = 200
+    timestamp_field = 'latest_report_at'
+    ordering = ('-latest_report_at', '-id')
@@ -0,0 +1,49 @@
+"""
+Set-based moderation review actions
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from posts.expiry import delete_posts
+from posts.models import Post
+
+from .models import Report
+from .scoring import reset_report_totals
+
+# Report status recorded by each review action
+REVIEW_ACTIONS = {
+    'delete_post': 'action_taken',
+    'dismiss': 'dismissed',
+    'mark_reviewed': 'reviewed',
+}
+
+
+def review_reports(action, reviewer, report_ids=(), post_uuids=()):
+    """
+    Apply a review action to the posts behind report_ids and post_uuids in
+    one transaction, closing every pending report on those posts rather
+    than only the listed ones.
+
+    delete_post removes the posts (their reports go with them, as the
+    foreign key cascades); dismiss and mark_reviewed are one UPDATE of the
+    reports, plus one that un-hides the posts and resets their totals.
+    Returns {'posts': posts affected, 'reports': reports closed}.
+    """
+    status = REVIEW_ACTIONS[action]
+    report_ids, post_uuids = list(report_ids), list(post_uuids)
+    with transaction.atomic():
+        post_ids = list(
+            Post.objects.filter(Q(uuid__in=post_uuids) | Q(reports__in=report_ids))
+            .order_by().values_list('id', flat=True).distinct()
+        )
+        if action == 'delete_post':
+            deleted, cascaded = delete_posts(post_ids)
+            return {'posts': deleted, 'reports': cascaded.get(Report._meta.db_table, 0)}
+
+        closed = Report.objects.filter(
+            Q(pk__in=report_ids) | Q(post_id__in=post_ids, status='pending')
+        ).update(status=status, reviewed_by=reviewer, reviewed_at=timezone.now())
+        # The posts were judged acceptable: show them again, counting afresh
+        reset_report_totals(post_ids)
+    return {'posts': len(post_ids), 'reports': closed}
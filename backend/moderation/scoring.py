@@ -0,0 +1,63 @@
+"""
+Per-post report totals and threshold auto-hide.
+
+Each new report adds one to its post's report_count and its reason's
+weight to report_score, and moves latest_report_at (the moderation queue
+order) to its time; once either crosses its AUTO_HIDE threshold the
+post's is_hidden flag is set and the feed (which filters on that indexed
+column) stops showing it. A moderator review resets the totals.
+"""
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from posts.cache import invalidate_feed
+from posts.live import publish_event
+from posts.models import Post
+
+
+def report_weight(reason):
+    return settings.REPORT_REASON_WEIGHTS.get(reason, 1)
+
+
+def hide_condition():
+    """Q matching posts whose totals cross a threshold, or None if both are off"""
+    conditions = []
+    if settings.AUTO_HIDE_REPORT_COUNT:
+        conditions.append(Q(report_count__gte=settings.AUTO_HIDE_REPORT_COUNT))
+    if settings.AUTO_HIDE_REPORT_SCORE:
+        conditions.append(Q(report_score__gte=settings.AUTO_HIDE_REPORT_SCORE))
+    return reduce(or_, conditions) if conditions else None
+
+
+def record_report(report):
+    """
+    Add a new report to its post's totals and hide the post if that crosses
+    a threshold. Two single-row UPDATEs by primary key, run in the caller's
+    transaction; the second only matches on the report that tips it over.
+    Returns True if the post was hidden.
+    """
+    posts = Post.objects.filter(pk=report.post_id)
+    posts.update(
+        report_count=F('report_count') + 1,
+        report_score=F('report_score') + report_weight(report.reason),
+        # PostgreSQL's GREATEST skips the NULL left by a review
+        latest_report_at=Greatest('latest_report_at', Value(report.timestamp)),
+    )
+    condition = hide_condition()
+    if condition is None or not posts.filter(condition, is_hidden=False).update(is_hidden=True):
+        return False
+    invalidate_feed()
+    publish_event('hidden', {'uuid': report.post.uuid})
+    return True
+
+
+def reset_report_totals(post_ids):
+    """Clear the totals of reviewed posts and show them again"""
+    if Post.objects.filter(pk__in=post_ids).update(
+        report_count=0, report_score=0, latest_report_at=None, is_hidden=False
+    ):
+        invalidate_feed()
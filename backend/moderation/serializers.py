@@ -1,12 +1,17 @@
 """
 Serializers for moderation and reporting
 """
+from django.db import transaction
 from rest_framework import serializers
+
+from config.instrumentation import InstrumentedSerializerMixin
 from .models import Report
+from .review import REVIEW_ACTIONS
+from .scoring import record_report
 from posts.serializers import PostSerializer
 
 
-class ReportSerializer(serializers.ModelSerializer):
+class ReportSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer for creating reports"""
     post_details = PostSerializer(source='post', read_only=True)
     
@@ -24,13 +29,16 @@ class ReportSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'status', 'timestamp']
     
     def create(self, validated_data):
-        """Create report with current user as reporter"""
+        """Create report with current user as reporter and count it against the post"""
         request = self.context.get('request')
         validated_data['reporter'] = request.user
-        return super().create(validated_data)
+        with transaction.atomic():
+            report = super().create(validated_data)
+            record_report(report)
+        return report
 
 
-class ReportDetailSerializer(serializers.ModelSerializer):
+class ReportDetailSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Detailed serializer for admin review"""
     post_details = PostSerializer(source='post', read_only=True)
     reporter_username = serializers.CharField(source='reporter.username', read_only=True)
@@ -51,3 +59,49 @@ class ReportDetailSerializer(serializers.ModelSerializer):
             'reviewed_by_username',
         ]
         read_only_fields = ['id', 'timestamp', 'reviewed_at', 'reviewed_by_username']
+
+
+class PendingPostReportsSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    """
+    A reported post and its pending reports for the moderation queue.
+    Expects posts of Post.objects.reported() and the page's rows of
+    Report.objects.grouped_by_post(), keyed by post id, in context['groups'].
+    """
+    post = serializers.IntegerField(source='pk')
+    post_details = serializers.SerializerMethodField()
+    report_count = serializers.IntegerField()
+    reasons = serializers.SerializerMethodField()
+    is_hidden = serializers.BooleanField()
+    first_report_at = serializers.SerializerMethodField()
+    latest_report_at = serializers.DateTimeField()
+    
+    def get_post_details(self, obj):
+        return PostSerializer(obj, context=self.context).data
+    
+    def get_reasons(self, obj):
+        """Report count per reason, omitting reasons nobody chose"""
+        group = self.context['groups'].get(obj.pk, {})
+        counts = {reason: group.get(f'reasons_{reason}', 0) for reason, _ in Report.REASON_CHOICES}
+        return {reason: count for reason, count in counts.items() if count}
+    
+    def get_first_report_at(self, obj):
+        group = self.context['groups'].get(obj.pk)
+        if group is None:
+            return None
+        return serializers.DateTimeField().to_representation(group['first_report_at'])
+
+
+class BulkReviewSerializer(serializers.Serializer):
+    """Input for a bulk review: an action plus report ids and/or post uuids"""
+    action = serializers.ChoiceField(choices=list(REVIEW_ACTIONS))
+    report_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list, max_length=1000
+    )
+    post_uuids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, default=list, max_length=1000
+    )
+    
+    def validate(self, attrs):
+        if not attrs['report_ids'] and not attrs['post_uuids']:
+            raise serializers.ValidationError('Provide report_ids or post_uuids.')
+        return attrs
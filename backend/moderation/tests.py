@@ -0,0 +1,138 @@
+"""
+Tests for moderation
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.models import Post
+
+from .models import Report
+
+User = get_user_model()
+
+# Tests must not share (or clear) the Redis cache other processes use
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False, AUTO_HIDE_REPORT_COUNT=2, AUTO_HIDE_REPORT_SCORE=0)
+class ModerationQueueTests(TestCase):
+    """The pending queue and review actions"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='admin-password', is_staff=True)
+        self.reporters = [User.objects.create_user(username=f'reporter{index}') for index in range(3)]
+        author = User.objects.create_user(username='author')
+        self.posts = [Post.objects.create(user=author, content=f'Post {index}') for index in range(4)]
+
+    def report(self, reporter, post, reason='spam'):
+        self.client.force_login(reporter)
+        response = self.client.post('/api/moderation/reports/', {'post': post.pk, 'reason': reason})
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def pending(self, url='/api/moderation/reports/pending/', **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_queue_keeps_cursor_positions_when_posts_are_reported(self):
+        for post in self.posts:
+            self.report(self.reporters[0], post)
+        self.report(self.reporters[1], self.posts[1], reason='other')
+
+        first = self.pending(page_size=2)
+        self.assertEqual([row['post'] for row in first['results']], [self.posts[1].pk, self.posts[3].pk])
+        self.assertEqual(first['results'][0]['report_count'], 2)
+        self.assertEqual(first['results'][0]['reasons'], {'spam': 1, 'other': 1})
+        self.assertTrue(first['results'][0]['is_hidden'])
+
+        # A new report moves its post to the front, not into the next page
+        self.report(self.reporters[2], self.posts[0])
+        second = self.pending(first['next'])
+        self.assertEqual([row['post'] for row in second['results']], [self.posts[2].pk])
+        self.assertIsNone(second['next'])
+
+    def test_reviewed_posts_leave_the_queue(self):
+        self.report(self.reporters[0], self.posts[0])
+        self.report(self.reporters[0], self.posts[1])
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            '/api/moderation/reports/bulk_review/',
+            {'action': 'mark_reviewed', 'post_uuids': [str(self.posts[0].uuid)]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual([row['post'] for row in self.pending()['results']], [self.posts[1].pk])
+        self.posts[0].refresh_from_db()
+        self.assertIsNone(self.posts[0].latest_report_at)
+
+    def test_dismissing_one_report_unhides_the_post(self):
+        report_id = self.report(self.reporters[0], self.posts[0])
+        self.report(self.reporters[1], self.posts[0])
+        self.posts[0].refresh_from_db()
+        self.assertTrue(self.posts[0].is_hidden)
+
+        self.client.force_login(self.admin)
+        response = self.client.post(f'/api/moderation/reports/{report_id}/review/', {'action': 'dismiss'})
+        self.assertEqual(response.status_code, 200)
+
+        self.posts[0].refresh_from_db()
+        self.assertFalse(self.posts[0].is_hidden)
+        self.assertEqual(self.posts[0].report_count, 0)
+        self.assertFalse(Report.objects.filter(post=self.posts[0], status='pending').exists())
+        self.assertEqual(self.pending()['results'], [])
+
+    def bulk_review(self, action, report_ids=(), posts=()):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            '/api/moderation/reports/bulk_review/',
+            {'action': action, 'report_ids': list(report_ids), 'post_uuids': [str(post.uuid) for post in posts]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_bulk_dismiss_closes_every_pending_report_of_the_posts(self):
+        report_id = self.report(self.reporters[0], self.posts[0])
+        self.report(self.reporters[1], self.posts[0])
+        self.report(self.reporters[0], self.posts[1])
+        self.report(self.reporters[0], self.posts[2])
+        self.posts[0].refresh_from_db()
+        self.assertTrue(self.posts[0].is_hidden)
+
+        # One listed report closes the others on its post too
+        result = self.bulk_review('dismiss', report_ids=[report_id], posts=[self.posts[1]])
+        self.assertEqual(result, {'posts': 2, 'reports': 3})
+
+        for post in self.posts[:2]:
+            post.refresh_from_db()
+            self.assertEqual((post.report_count, post.report_score), (0, 0))
+            self.assertFalse(post.is_hidden)
+            self.assertIsNone(post.latest_report_at)
+        reviewed = Report.objects.filter(post__in=self.posts[:2])
+        self.assertEqual(set(reviewed.values_list('status', 'reviewed_by')), {('dismissed', self.admin.pk)})
+
+        # Posts that were not listed keep their reports and totals
+        self.posts[2].refresh_from_db()
+        self.assertEqual(self.posts[2].report_count, 1)
+        self.assertIsNotNone(self.posts[2].latest_report_at)
+        self.assertEqual([row['post'] for row in self.pending()['results']], [self.posts[2].pk])
+
+    def test_bulk_delete_post_removes_the_posts_and_their_reports(self):
+        report_id = self.report(self.reporters[0], self.posts[0])
+        self.report(self.reporters[1], self.posts[0])
+        self.report(self.reporters[0], self.posts[1])
+        self.report(self.reporters[0], self.posts[2])
+
+        result = self.bulk_review('delete_post', report_ids=[report_id], posts=[self.posts[1]])
+        self.assertEqual(result, {'posts': 2, 'reports': 3})
+
+        self.assertFalse(Post.objects.filter(pk__in=[post.pk for post in self.posts[:2]]).exists())
+        self.assertEqual(Report.objects.filter(post__in=self.posts[:2]).count(), 0)
+        self.posts[2].refresh_from_db()
+        self.assertEqual(self.posts[2].report_count, 1)
+        self.assertEqual([row['post'] for row in self.pending()['results']], [self.posts[2].pk])
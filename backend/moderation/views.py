@@ -5,11 +5,17 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.utils import timezone
 from django.shortcuts import get_object_or_404
 
 from .models import Report
-from .serializers import ReportSerializer, ReportDetailSerializer
+from .pagination import ReportQueuePagination
+from .review import review_reports
+from .serializers import (
+    BulkReviewSerializer,
+    PendingPostReportsSerializer,
+    ReportDetailSerializer,
+    ReportSerializer,
+)
 from posts.models import Post
 
 
@@ -69,50 +75,64 @@ class ReportViewSet(viewsets.ModelViewSet):
         action_type = request.data.get('action')  # 'delete_post', 'dismiss', 'mark_reviewed'
         
         if action_type == 'delete_post':
-            # Delete the reported post (without seeing user identity)
-            report.post.delete()
-            report.status = 'action_taken'
-            report.reviewed_by = request.user
-            report.reviewed_at = timezone.now()
-            report.save()
+            # Delete the reported post (without seeing user identity); its
+            # reports, this one included, are deleted with it
+            review_reports('delete_post', request.user, report_ids=[report.pk])
             
             return Response(
                 {'message': 'Post deleted and report marked as action taken'},
                 status=status.HTTP_200_OK
             )
         
-        elif action_type == 'dismiss':
-            report.status = 'dismissed'
-            report.reviewed_by = request.user
-            report.reviewed_at = timezone.now()
-            report.save()
+        elif action_type in ('dismiss', 'mark_reviewed'):
+            # Closes the post's other pending reports too and, as the post
+            # was judged acceptable, resets its totals and un-hides it
+            review_reports(action_type, request.user, report_ids=[report.pk])
+            message = 'Report dismissed' if action_type == 'dismiss' else 'Report marked as reviewed'
             
-            return Response(
-                {'message': 'Report dismissed'},
-                status=status.HTTP_200_OK
-            )
-        
-        elif action_type == 'mark_reviewed':
-            report.status = 'reviewed'
-            report.reviewed_by = request.user
-            report.reviewed_at = timezone.now()
-            report.save()
-            
-            return Response(
-                {'message': 'Report marked as reviewed'},
-                status=status.HTTP_200_OK
-            )
+            return Response({'message': message}, status=status.HTTP_200_OK)
         
         return Response(
             {'error': 'Invalid action type'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_review(self, request):
+        """
+        Admin action to review many reports at once: applies the action to
+        the posts of report_ids and post_uuids in one transaction and closes
+        all of their pending reports
+        """
+        serializer = BulkReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = review_reports(
+            serializer.validated_data['action'],
+            request.user,
+            report_ids=serializer.validated_data['report_ids'],
+            post_uuids=serializer.validated_data['post_uuids'],
+        )
+        return Response(result, status=status.HTTP_200_OK)
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def pending(self, request):
-        """Get all pending reports (admin only)"""
-        pending_reports = Report.objects.filter(status='pending').select_related(
-            'post', 'reporter', 'reviewed_by'
+        """
+        Pending reports grouped by post, most recently reported first (admin
+        only). Keyset-paginated over the posts' own report_count and
+        latest_report_at; a page is one index range scan of the posts plus
+        one GROUP BY over the pending reports of that page.
+        """
+        paginator = ReportQueuePagination()
+        posts = paginator.paginate_queryset(
+            Post.objects.reported().with_feed_annotations(request.user), request, view=self
+        )
+        groups = {
+            group['post']: group
+            for group in Report.objects.pending().filter(
+                post__in=[post.pk for post in posts]
+            ).grouped_by_post()
+        }
+        serializer = PendingPostReportsSerializer(
+            posts, many=True, context={'request': request, 'groups': groups}
         )
-        serializer = self.get_serializer(pending_reports, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
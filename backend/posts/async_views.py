@@ -0,0 +1,195 @@
+"""
+Async read endpoints for the ASGI deployment (config/asgi.py).
+
+GET requests for the feed, comments (?parent_uuid=), post detail and
+today's topic are served here with the async ORM; independent queries run
+concurrently. Authentication and throttling use the DRF classes from
+REST_FRAMEWORK, and responses and caching match the DRF viewsets, which
+still handle every other method and the browsable API.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .buffers import get_like_buffer, get_view_buffer
+from .cache import namespaced_key
+from .feed import apply_user_flags, feed_cache_key, feed_queryset, shared_payload
+from .models import Post, Topic
+from .pagination import PostCursorPagination
+from .serializers import PostDetailSerializer, PostSerializer, TopicSerializer, comments_base_url
+from .views import PostViewSet, TopicViewSet
+
+_post_list_view = PostViewSet.as_view({'get': 'list', 'post': 'create'})
+_post_detail_view = PostViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+_topic_today_view = TopicViewSet.as_view({'get': 'today'})
+
+
+def _use_sync_view(request):
+    """Writes and the browsable API stay on the DRF viewsets"""
+    return request.method != 'GET' or 'text/html' in request.headers.get('Accept', '')
+
+
+def _throttled(request):
+    """Apply the default DRF throttles; returns a 429 response or None"""
+    waits = [
+        throttle.wait()
+        for throttle in (throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES)
+        if not throttle.allow_request(request, None)
+    ]
+    if not waits:
+        return None
+    wait = max((wait for wait in waits if wait is not None), default=None)
+    exc = Throttled(wait)
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    if wait is not None:
+        response['Retry-After'] = str(int(wait))
+    return response
+
+
+def _begin(request, cache_key_func):
+    """
+    Authenticate with the DRF authenticators, throttle and look up the
+    cached body in one hop off the event loop. Returns
+    (user, error_response, cache_key, cached_data).
+    """
+    drf_request = Request(request, authenticators=[
+        authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    user = request.user = drf_request.user
+    throttled = _throttled(drf_request)
+    if throttled:
+        return user, throttled, None, None
+    cache_key = cache_key_func(request)
+    return user, None, cache_key, cache.get(cache_key)
+
+
+async def _concurrently(*funcs):
+    """
+    Run independent blocking queries at the same time. Each runs on a pool
+    thread with its own connection, closed afterwards (the async ORM in
+    Django 4.2 would run them one after another on the request's thread).
+    """
+    def run(func):
+        try:
+            return func()
+        finally:
+            connections.close_all()
+
+    return await asyncio.gather(*(
+        sync_to_async(run, thread_sensitive=False)(func) for func in funcs
+    ))
+
+
+async def post_list(request):
+    """Feed page, or the comments of ?parent_uuid=, newest first"""
+    if _use_sync_view(request):
+        return await sync_to_async(_post_list_view)(request)
+
+    user, throttled, cache_key, data = await sync_to_async(_begin)(
+        request, lambda request: feed_cache_key(request, 'list')
+    )
+    if throttled:
+        return throttled
+
+    if data is None:
+        paginator = PostCursorPagination()
+        page = await paginator.apaginate_queryset(
+            feed_queryset(user, request.GET.get('parent_uuid')), Request(request)
+        )
+        data = paginator.get_paginated_response(
+            PostSerializer(page, many=True, context={'request': request}).data
+        ).data
+        await cache.aset(cache_key, shared_payload(data), settings.FEED_CACHE_SECONDS)
+        if user.is_authenticated and get_like_buffer() is not None:
+            await sync_to_async(apply_user_flags)(data, user)
+    elif user.is_authenticated:
+        data = await sync_to_async(apply_user_flags)(data, user)
+
+    return JsonResponse(data)
+
+
+async def post_detail(request, pk):
+    """A post with its first page of comments; records a view"""
+    if _use_sync_view(request):
+        return await sync_to_async(_post_detail_view)(request, pk=pk)
+
+    user, throttled, cache_key, data = await sync_to_async(_begin)(
+        request, lambda request: feed_cache_key(request, 'retrieve')
+    )
+    if throttled:
+        return throttled
+
+    view_buffer = get_view_buffer()
+
+    if data is None:
+        # The post and its first page of comments are fetched side by side
+        paginator = PostCursorPagination()
+        post, comments = await _concurrently(
+            lambda: feed_queryset(user, request.GET.get('parent_uuid')).filter(pk=pk).first(),
+            lambda: paginator.first_page(
+                Post.objects.visible().filter(parent_id=pk).with_feed_annotations(user),
+                settings.COMMENTS_PAGE_SIZE,
+            ),
+        )
+        if post is None:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+
+        post.views += await sync_to_async(view_buffer.record)(post.pk)
+
+        paginator.base_url = comments_base_url(post, request)
+        comments_page = (comments, paginator.get_next_link())
+        data = PostDetailSerializer(post, context={
+            'request': request,
+            'comments_pages': {post.pk: comments_page},
+        }).data
+        await cache.aset(cache_key, shared_payload(data), settings.FEED_CACHE_SECONDS)
+        if user.is_authenticated and get_like_buffer() is not None:
+            await sync_to_async(apply_user_flags)(data, user)
+    elif user.is_authenticated:
+        # Buffering the view and merging the user's flags are independent
+        _, data = await _concurrently(
+            lambda: view_buffer.record(pk),
+            lambda: apply_user_flags(data, user),
+        )
+    else:
+        # Buffer the view; the cached body shows views as of caching
+        await sync_to_async(view_buffer.record)(pk)
+
+    return JsonResponse(data)
+
+
+async def topic_today(request):
+    """Today's topic, or 404 when none is set"""
+    if _use_sync_view(request):
+        return await sync_to_async(_topic_today_view)(request)
+
+    today = timezone.now().date()
+    _, throttled, cache_key, data = await sync_to_async(_begin)(
+        request, lambda request: namespaced_key('topics', 'today', today.isoformat())
+    )
+    if throttled:
+        return throttled
+
+    if data is None:
+        topic = await Topic.objects.filter(date=today).afirst()
+        # An empty dict records "no topic" so misses are cached too
+        data = dict(TopicSerializer(topic).data) if topic else {}
+        await cache.aset(cache_key, data, settings.TOPIC_CACHE_SECONDS)
+
+    if data:
+        return JsonResponse(data)
+
+    return JsonResponse({'message': 'No topic for today'}, status=404)
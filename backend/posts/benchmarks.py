@@ -0,0 +1,44 @@
+"""
+Helpers shared by the benchmark management commands
+"""
+import itertools
+import math
+import statistics
+
+WORDS = (
+    'today anyone else think the new cafe downtown is overrated honestly '
+    'exams library coffee weekend rain music playlist movie late night bus '
+    'campus project deadline friends group chat vibe sunset walk dog cat '
+    'pizza gym morning tired happy weird random question advice story'
+).split()
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, math.ceil(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize_latencies(latencies, wall):
+    """Throughput and latency percentiles (ms) for a list of request durations"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative Zipf weights for random.choices: rank k is drawn ~ 1 / k**exponent"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def make_content(rng, low=5, high=40):
+    """Plausible post text that passes the content filter"""
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
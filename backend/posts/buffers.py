@@ -0,0 +1,433 @@
+"""
+Write buffers that batch hot counter increments and like writes before they
+reach the database.
+
+Redis buffers are drained by claiming: CLAIM_SCRIPT atomically renames the
+live hash to a claim key named by a fresh token, so writes that arrive
+during a flush go to a new hash. Each claim is applied in a transaction
+that also records its token (BufferFlush), so a claim that is read again,
+because its cleanup failed or a concurrent flush picked it up, is applied
+only once. The Redis like buffer keeps a single processing hash instead, so
+that batches are applied in the order they were buffered: LIKE_CLAIM_SCRIPT
+moves the live hash there and tags it with a token only once the previous
+batch is gone, and the batch is removed only after apply_once has recorded
+that token. In-memory buffers are flushed by a background thread of their
+process, never inside a request.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .cache import invalidate_feed
+from .live import publish_event
+from .models import BufferFlush, Like, Post
+
+logger = logging.getLogger(__name__)
+
+# KEYS: live hash, set of unfinished claim tokens, claim key for ARGV[1].
+# Returns every unfinished token, including those of flushes that died.
+CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[3])
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+return redis.call('SMEMBERS', KEYS[2])
+"""
+
+# KEYS: live hash, processing hash. ARGV: token for a new batch.
+# Returns the processing hash, claiming the live hash into it first unless
+# an unfinished batch is still there; TOKEN_FIELD holds the batch's token.
+LIKE_CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('HSET', KEYS[2], ARGV[2], ARGV[1])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS: processing hash. ARGV: token, token field. Deletes the batch only if
+# it is still the one with that token.
+LIKE_RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[2]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Tokens of applied flushes are kept this long; a claim left in Redis for
+# longer than this would be applied again
+BUFFER_FLUSH_RETENTION = timedelta(days=1)
+
+
+def apply_once(token, apply, changes):
+    """
+    Run apply(changes) in a transaction that records token, or do nothing
+    and return 0 if token has been applied already
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                BufferFlush.objects.create(token=token)
+        except IntegrityError:
+            return 0
+        return apply(changes)
+
+
+def apply_view_increments(increments):
+    """
+    Apply {post_id: n} to Post.views in a single UPDATE ... SET views = views + n.
+    Returns the number of rows updated.
+    """
+    increments = {int(pk): int(n) for pk, n in increments.items() if int(n) > 0}
+    if not increments:
+        return 0
+
+    return Post.objects.filter(pk__in=increments.keys()).update(views=F('views') + _per_post(increments))
+
+
+def _per_post(values):
+    """CASE expression giving values[pk] for each post and 0 for any other"""
+    return Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+class InMemoryBuffer:
+    """
+    Base for per-process buffers: the first write starts a daemon thread
+    (one per process, so forked workers get their own) that calls flush()
+    every flush_seconds
+    """
+
+    def __init__(self, flush_seconds):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def _ensure_flusher(self):
+        """Start this process's flush thread; call with self._lock held"""
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(
+                target=self._flush_periodically, name=f'{type(self).__name__}-flush', daemon=True
+            ).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing %s failed; retrying in %ss', type(self).__name__, self.flush_seconds)
+            finally:
+                # Connections are per thread; this one's would never be closed
+                connections.close_all()
+
+    def flush(self):
+        raise NotImplementedError
+
+
+class RedisBuffer:
+    """Base for cluster-wide buffers kept in a Redis hash and drained by claiming"""
+
+    def __init__(self, url, key):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.claims_key = f'{key}:claims'
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+
+    def claim_key(self, token):
+        return f'{self.key}:claim:{token}'
+
+    def apply(self, snapshot):
+        """Write a claimed hash ({bytes: bytes}) to the database"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Claim the live hash, then apply and remove every unfinished claim"""
+        token = uuid.uuid4().hex
+        tokens = self._claim(keys=[self.key, self.claims_key, self.claim_key(token)], args=[token])
+        applied = 0
+        for claimed in sorted(claimed.decode() for claimed in tokens):
+            snapshot = self.client.hgetall(self.claim_key(claimed))
+            if snapshot:
+                applied += apply_once(claimed, self.apply, snapshot)
+            pipe = self.client.pipeline()
+            pipe.delete(self.claim_key(claimed))
+            pipe.srem(self.claims_key, claimed)
+            pipe.execute()
+        if tokens:
+            BufferFlush.objects.filter(created_at__lt=timezone.now() - BUFFER_FLUSH_RETENTION).delete()
+        return applied
+
+
+class InMemoryViewBuffer(InMemoryBuffer):
+    """
+    Per-process view buffer, flushed by its background thread every
+    VIEW_COUNT_FLUSH_SECONDS
+    """
+
+    def __init__(self, flush_seconds):
+        super().__init__(flush_seconds)
+        self._counts = Counter()
+
+    def record(self, post_id):
+        """Buffer a view; returns the views of post_id now waiting to be flushed"""
+        with self._lock:
+            self._ensure_flusher()
+            self._counts[post_id] += 1
+            return self._counts[post_id]
+
+    def flush(self):
+        with self._lock:
+            snapshot, self._counts = self._counts, Counter()
+        try:
+            return apply_view_increments(snapshot)
+        except Exception:
+            # Put the increments back so a failed flush loses nothing
+            with self._lock:
+                self._counts.update(snapshot)
+            raise
+
+
+class RedisViewBuffer(RedisBuffer):
+    """
+    Cluster-wide view buffer stored in a Redis hash (HINCRBY per view).
+    The flush_view_counts Celery task drains it every
+    VIEW_COUNT_FLUSH_SECONDS, which bounds staleness across all replicas.
+    """
+
+    def record(self, post_id):
+        """Buffer a view; returns the views of post_id now waiting to be flushed"""
+        return self.client.hincrby(self.key, post_id, 1)
+
+    def apply(self, snapshot):
+        return apply_view_increments(snapshot)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_view_buffer():
+    """Return the process-wide view buffer configured in settings"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if settings.VIEW_COUNT_BUFFER == 'redis':
+                    _buffer = RedisViewBuffer(settings.REDIS_URL, settings.VIEW_COUNT_BUFFER_KEY)
+                else:
+                    _buffer = InMemoryViewBuffer(settings.VIEW_COUNT_FLUSH_SECONDS)
+    return _buffer
+
+
+def apply_like_changes(changes, chunk_size=500):
+    """
+    Apply coalesced {(user_id, post_id): liked} states with chunked
+    INSERT ... ON CONFLICT DO NOTHING and DELETE statements that return the
+    rows they changed, then one UPDATE adding each post's net change to
+    likes_count, so applying the same states twice changes nothing. Pairs
+    whose post or user is gone are dropped. Returns the number of posts
+    whose likes_count changed.
+    """
+    changes = {(int(user_id), int(post_id)): bool(liked) for (user_id, post_id), liked in changes.items()}
+    if not changes:
+        return 0
+
+    live_posts = dict(Post.objects.filter(
+        pk__in={post_id for _, post_id in changes}
+    ).values_list('pk', 'timestamp'))
+    live_users = set(get_user_model().objects.filter(
+        pk__in={user_id for user_id, _ in changes}
+    ).values_list('pk', flat=True))
+    changes = {
+        pair: liked for pair, liked in changes.items()
+        if pair[0] in live_users and pair[1] in live_posts
+    }
+    liked = [pair for pair, state in changes.items() if state]
+    unliked = [pair for pair, state in changes.items() if not state]
+
+    using = router.db_for_write(Like)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(Like._meta.db_table)
+    user, post, post_timestamp, timestamp = (
+        quote(Like._meta.get_field(field).column)
+        for field in ('user', 'post', 'post_timestamp', 'timestamp')
+    )
+    now = timezone.now()
+    deltas = Counter()
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            for start in range(0, len(liked), chunk_size):
+                chunk = liked[start:start + chunk_size]
+                cursor.execute(
+                    f'INSERT INTO {table} ({user}, {post}, {post_timestamp}, {timestamp}) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(chunk))} '
+                    f'ON CONFLICT ({user}, {post}, {post_timestamp}) DO NOTHING RETURNING {post}',
+                    [
+                        value for user_id, post_id in chunk
+                        for value in (user_id, post_id, live_posts[post_id], now)
+                    ],
+                )
+                deltas.update(row[0] for row in cursor.fetchall())
+            for start in range(0, len(unliked), chunk_size):
+                chunk = unliked[start:start + chunk_size]
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE ({user}, {post}) IN '
+                    f'({", ".join(["(%s, %s)"] * len(chunk))}) RETURNING {post}',
+                    [value for pair in chunk for value in pair],
+                )
+                deltas.subtract(row[0] for row in cursor.fetchall())
+        deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        changed = Post.objects.filter(pk__in=deltas)
+        changed.update(likes_count=F('likes_count') + _per_post(deltas))
+        invalidate_feed()
+        if settings.LIVE_FEED:
+            for uuid, likes_count in changed.values_list('uuid', 'likes_count'):
+                publish_event('likes', {'uuid': uuid, 'likes_count': likes_count})
+    return len(deltas)
+
+
+class InMemoryLikeBuffer(InMemoryBuffer):
+    """
+    Per-process like buffer holding the latest liked/unliked state per
+    (user, post), flushed by its background thread every
+    LIKE_FLUSH_SECONDS. States stay visible to pending() until their flush
+    has committed.
+    """
+
+    def __init__(self, flush_seconds):
+        super().__init__(flush_seconds)
+        self._states = {}
+        self._flushing = {}
+
+    def record(self, user_id, post_id, liked):
+        with self._lock:
+            self._ensure_flusher()
+            self._states[(user_id, post_id)] = liked
+
+    def pending(self, user_id, post_ids):
+        """{post_id: liked} for the user's likes not yet in the database"""
+        with self._lock:
+            states = {}
+            for post_id in post_ids:
+                key = (user_id, post_id)
+                if key in self._states:
+                    states[post_id] = self._states[key]
+                elif key in self._flushing:
+                    states[post_id] = self._flushing[key]
+            return states
+
+    def flush(self):
+        with self._lock:
+            snapshot, self._states = self._states, {}
+            self._flushing = snapshot
+        try:
+            return apply_like_changes(snapshot)
+        except Exception:
+            # Put the states back without overwriting newer ones
+            with self._lock:
+                for key, liked in snapshot.items():
+                    self._states.setdefault(key, liked)
+            raise
+        finally:
+            with self._lock:
+                self._flushing = {}
+
+
+class RedisLikeBuffer:
+    """
+    Cluster-wide like buffer: a Redis hash of "user:post" -> 1/0 in which a
+    repeat tap simply overwrites the previous state. The flush_like_buffer
+    Celery task drains it every LIKE_FLUSH_SECONDS.
+    """
+    # Not a "user:post" field, so it never collides with a like state
+    token_field = 'token'
+
+    def __init__(self, url, key):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.processing_key = f'{key}:flushing'
+        self._claim = self.client.register_script(LIKE_CLAIM_SCRIPT)
+        self._release = self.client.register_script(LIKE_RELEASE_SCRIPT)
+
+    def record(self, user_id, post_id, liked):
+        self.client.hset(self.key, f'{user_id}:{post_id}', int(liked))
+
+    def pending(self, user_id, post_ids):
+        """{post_id: liked} for the user's likes not yet in the database"""
+        post_ids = list(post_ids)
+        if not post_ids:
+            return {}
+        fields = [f'{user_id}:{post_id}' for post_id in post_ids]
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(self.key, fields)
+        pipe.hmget(self.processing_key, fields)
+        current, flushing = pipe.execute()
+        states = {}
+        for post_id, new, old in zip(post_ids, current, flushing):
+            value = new if new is not None else old
+            if value is not None:
+                states[post_id] = value == b'1'
+        return states
+
+    def flush(self):
+        """
+        Claim a batch and apply it once. A batch left by a flush that died,
+        or being applied by a concurrent one, is claimed again instead of
+        the live hash; apply_once skips it if its token was applied already.
+        """
+        batch = self._claim(
+            keys=[self.key, self.processing_key], args=[uuid.uuid4().hex, self.token_field]
+        )
+        if not batch:
+            # Nothing buffered since the last flush
+            return 0
+        fields = dict(zip(batch[::2], batch[1::2]))
+        token = fields.pop(self.token_field.encode()).decode()
+        snapshot = {
+            tuple(field.decode().split(':')): value == b'1'
+            for field, value in fields.items()
+        }
+        updated = apply_once(token, apply_like_changes, snapshot)
+        self._release(keys=[self.processing_key], args=[token, self.token_field])
+        BufferFlush.objects.filter(created_at__lt=timezone.now() - BUFFER_FLUSH_RETENTION).delete()
+        return updated
+
+
+_like_buffer = None
+
+
+def get_like_buffer():
+    """Return the process-wide like buffer, or None when likes are written directly"""
+    global _like_buffer
+    if settings.LIKE_BUFFER not in ('redis', 'memory'):
+        return None
+    if _like_buffer is None:
+        with _buffer_lock:
+            if _like_buffer is None:
+                if settings.LIKE_BUFFER == 'redis':
+                    _like_buffer = RedisLikeBuffer(settings.REDIS_URL, settings.LIKE_BUFFER_KEY)
+                else:
+                    _like_buffer = InMemoryLikeBuffer(settings.LIKE_FLUSH_SECONDS)
+    return _like_buffer
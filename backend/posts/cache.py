@@ -0,0 +1,51 @@
+"""
+Shared cache helpers: namespaced keys with versioned invalidation.
+
+Every namespace has a version counter stored in the cache. Keys built with
+namespaced_key() embed the current version, so bump_namespace() invalidates
+everything in a namespace at once (old entries simply expire).
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+# Feed pages and post detail payloads; bumped on every write that changes them
+FEED_NAMESPACE = 'feed'
+
+
+def _version_key(namespace):
+    return f'ns:{namespace}'
+
+
+def namespace_version(namespace):
+    """Current version number of a cache namespace"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_namespace(namespace):
+    """Invalidate every key in a namespace; returns the new version"""
+    key = _version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Version not set yet (or evicted): start past the implicit 1
+        cache.add(key, 1, timeout=None)
+        return cache.incr(key)
+
+
+def namespaced_key(namespace, *parts):
+    """Build a cache key that is invalidated by bump_namespace(namespace)"""
+    version = namespace_version(namespace)
+    return ':'.join([namespace, f'v{version}', *(str(part) for part in parts)])
+
+
+def invalidate_feed():
+    """
+    Bump the feed namespace once the current transaction commits, so a
+    concurrent reader cannot re-cache pre-commit rows under the new version
+    """
+    transaction.on_commit(lambda: bump_namespace(FEED_NAMESPACE))
@@ -0,0 +1,158 @@
+"""
+Chunked, set-based expiry of old posts
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from .cache import invalidate_feed
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def describe_batch(batch):
+    """One-line summary of an expiry batch for logs and command output"""
+    cascaded = ', '.join(f"{count} {table}" for table, count in batch['cascaded'].items())
+    return (
+        f"Batch {batch['number']} ({batch['kind']}): deleted {batch['posts']} posts"
+        f"{' + ' + cascaded if cascaded else ''} in {batch['seconds'] * 1000:.1f} ms"
+    )
+
+
+def dependent_relations():
+    """Reverse foreign keys to Post (likes, reports, ...) and their on_delete"""
+    return [
+        relation for relation in Post._meta.related_objects
+        if relation.one_to_many or relation.one_to_one
+    ]
+
+
+def _delete_post_ids(ids):
+    """
+    Delete the given posts and their dependent rows with one statement per
+    table, bypassing the ORM collector (no instances loaded, no signals).
+    Returns {table_name: rows} for the cascaded tables.
+    """
+    using = router.db_for_write(Post)
+    cascaded = {}
+    for relation in dependent_relations():
+        related_model = relation.related_model
+        queryset = related_model._base_manager.using(using).filter(
+            **{f'{relation.field.name}__in': ids}
+        )
+        if relation.on_delete is models.CASCADE:
+            cascaded[related_model._meta.db_table] = queryset._raw_delete(using)
+        elif relation.on_delete is models.SET_NULL:
+            queryset.update(**{relation.field.name: None})
+    deleted = Post._base_manager.using(using).filter(id__in=ids)._raw_delete(using)
+    return deleted, cascaded
+
+
+def _parent_comment_counts(ids):
+    """[{'parent': id, 'total': n}] for the comments among ids"""
+    return list(
+        Post.objects.filter(id__in=ids, parent__isnull=False)
+        .order_by().values('parent').annotate(total=Count('id'))
+    )
+
+
+def _decrement_parent_comment_counts(parent_counts):
+    """Parents that survive a deletion lose the deleted comments"""
+    for row in parent_counts:
+        Post.objects.filter(pk=row['parent']).update(
+            comments_count=F('comments_count') - row['total']
+        )
+
+
+def delete_posts(ids):
+    """
+    Delete the given posts and their likes/reports set-based, keeping the
+    surviving parents' comments_count in step. Runs in the caller's
+    transaction. Returns (posts_deleted, {table_name: rows}).
+    """
+    ids = list(ids)
+    if not ids:
+        return 0, {}
+    parent_counts = _parent_comment_counts(ids)
+    deleted, cascaded = _delete_post_ids(ids)
+    _decrement_parent_comment_counts(parent_counts)
+    invalidate_feed()
+    return deleted, cascaded
+
+
+def _expire_in_batches(queryset, kind, batch_size, maintain_parent_counts):
+    """Delete queryset rows batch_size at a time in timestamp order"""
+    batches = []
+    while True:
+        started = time.perf_counter()
+        with transaction.atomic():
+            ids = list(
+                queryset.order_by('timestamp').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            parent_counts = _parent_comment_counts(ids) if maintain_parent_counts else []
+            deleted, cascaded = _delete_post_ids(ids)
+            _decrement_parent_comment_counts(parent_counts)
+
+        batch = {
+            'number': len(batches) + 1,
+            'kind': kind,
+            'posts': deleted,
+            'cascaded': cascaded,
+            'seconds': time.perf_counter() - started,
+        }
+        logger.info(describe_batch(batch))
+        batches.append(batch)
+    if batches:
+        invalidate_feed()
+    return batches
+
+
+def expire_orphaned_comments(batch_size=1000):
+    """
+    Delete comments whose parent no longer exists, in bounded batches.
+    Returns a list of batch stats.
+    """
+    orphaned = Post.objects.filter(parent_uuid__isnull=False).exclude(
+        Exists(Post.objects.filter(pk=OuterRef('parent_id')))
+    )
+    return _expire_in_batches(orphaned, 'orphaned', batch_size, maintain_parent_counts=False)
+
+
+def expire_posts(time_limit, batch_size=1000):
+    """
+    Delete posts with timestamp <= time_limit, then comments whose parent
+    no longer exists. Work is done in bounded batches, each in its own short
+    transaction, walking the timestamp index. Returns a list of batch stats.
+    """
+    expired = Post.objects.filter(timestamp__lte=time_limit)
+    batches = _expire_in_batches(expired, 'expired', batch_size, maintain_parent_counts=True)
+    return batches + expire_orphaned_comments(batch_size)
+
+
+def expire_old_posts(batch_size=1000, now=None):
+    """
+    Expire posts older than POST_DELETION_HOURS. With partitioned storage
+    the partitions wholly before the cutoff are dropped first, so the
+    batched DELETEs only cover the partition holding the cutoff, from its
+    start up to the cutoff. Both steps run one after the other, never
+    concurrently. Returns (dropped partition names, batch stats).
+    """
+    # posts.partitioning imports this module
+    from .partitioning import is_partitioned, maintain_partitions, partitioning_enabled
+    
+    now = now or timezone.now()
+    dropped = []
+    if partitioning_enabled() and is_partitioned():
+        # expire_posts sweeps the comments orphaned by the drop
+        _, dropped, _ = maintain_partitions(now, sweep_orphans=False)
+    time_limit = now - timedelta(hours=settings.POST_DELETION_HOURS)
+    return dropped, expire_posts(time_limit, batch_size)
@@ -0,0 +1,82 @@
+"""
+Feed helpers shared by the DRF viewsets (views.py) and the async read
+views (async_views.py)
+"""
+import copy
+from urllib.parse import urlencode
+
+from .cache import FEED_NAMESPACE, namespaced_key
+from .likes import overlay_pending_likes
+from .models import Post
+
+# Query params that select a cached feed page; anything else is ignored
+FEED_CACHE_PARAMS = ('cursor', 'page_size', 'parent_uuid')
+
+
+def feed_queryset(user, parent_uuid=None):
+    """
+    Posts as the feed shows them: top-level posts by default, or the
+    comments of parent_uuid, annotated with the user's like state.
+    Auto-hidden posts are left out.
+    """
+    queryset = Post.objects.visible().select_related('topic').with_feed_annotations(
+        user
+    ).order_by('-timestamp')
+    
+    # Filter by parent_uuid to get comments for a specific post
+    if parent_uuid:
+        return queryset.filter(parent__uuid=parent_uuid)
+    # By default, only return top-level posts (not comments)
+    return queryset.filter(parent_uuid__isnull=True)
+
+
+def feed_cache_key(request, action):
+    """
+    Cache key for a feed page or detail payload: URL plus the params that
+    select it, under the current feed version
+    """
+    params = urlencode(sorted(
+        (name, request.GET[name]) for name in FEED_CACHE_PARAMS if name in request.GET
+    ))
+    return namespaced_key(FEED_NAMESPACE, action, request.build_absolute_uri(request.path), params)
+
+
+def payload_posts(data):
+    """Post dicts inside a feed page or a post detail payload"""
+    if 'results' in data:
+        return data['results']
+    return [data, *data.get('comments', [])]
+
+
+def shared_payload(data):
+    """Copy of a response body with the per-user flags cleared for caching"""
+    data = copy.deepcopy(data)
+    for post in payload_posts(data):
+        post['is_liked_by_user'] = False
+        post['is_owned_by_user'] = False
+    return data
+
+
+def apply_user_flags(data, user):
+    """
+    Merge user's like/ownership flags into a shared payload (one query),
+    plus any of their likes still waiting in the write-behind buffer
+    """
+    posts = payload_posts(data)
+    if not posts:
+        return data
+    flags = {
+        str(uuid): (pk, liked, user_id == user.pk)
+        for uuid, pk, user_id, liked in Post.objects.filter(
+            uuid__in=[post['uuid'] for post in posts]
+        ).with_feed_annotations(user).values_list('uuid', 'id', 'user_id', 'is_liked_by_user')
+    }
+    by_id = {}
+    for post in posts:
+        pk, post['is_liked_by_user'], post['is_owned_by_user'] = flags.get(
+            str(post['uuid']), (None, False, False)
+        )
+        if pk is not None:
+            by_id[pk] = post
+    overlay_pending_likes(user.pk, by_id)
+    return data
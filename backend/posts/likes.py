@@ -0,0 +1,150 @@
+"""
+Single-statement like writes that keep Post.likes_count in step.
+
+Each helper issues one INSERT ... ON CONFLICT DO NOTHING or DELETE ...
+RETURNING for the like row, then (only if a row actually changed) one
+UPDATE ... RETURNING for the counter, so repeated or concurrent requests
+are idempotent and never raise IntegrityError or need a recount.
+
+With LIKE_BUFFER set, likes are instead recorded in a write-behind buffer
+and acknowledged at once; flush_like_buffer applies them in bulk.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .buffers import get_like_buffer
+from .cache import invalidate_feed
+from .live import publish_event
+from .models import Like, Post
+
+
+def _quoted(connection, model, *fields):
+    names = [connection.ops.quote_name(model._meta.db_table)]
+    names += [connection.ops.quote_name(model._meta.get_field(field).column) for field in fields]
+    return names
+
+
+def _bump_likes_count(cursor, connection, post_id, delta):
+    """Apply delta to likes_count, announce it, and return the new value"""
+    table, likes_count, pk, uuid = _quoted(connection, Post, 'likes_count', 'id', 'uuid')
+    cursor.execute(
+        f'UPDATE {table} SET {likes_count} = {likes_count} + %s WHERE {pk} = %s '
+        f'RETURNING {likes_count}, {uuid}',
+        [delta, post_id],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    publish_event('likes', {'uuid': Post._meta.get_field('uuid').to_python(row[1]), 'likes_count': row[0]})
+    return row[0]
+
+
+def _current_likes_count(cursor, connection, post_id):
+    table, likes_count, pk = _quoted(connection, Post, 'likes_count', 'id')
+    cursor.execute(f'SELECT {likes_count} FROM {table} WHERE {pk} = %s', [post_id])
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _buffer_like(buffer, user_id, post_id, liked=None):
+    """
+    Record the user's like state in the write-behind buffer (liked=None
+    toggles). Returns (changed, liked, likes_count), where likes_count is
+    what the user will see once the buffer has been flushed.
+    """
+    row = Post.objects.filter(pk=post_id).annotate(
+        stored=Exists(Like.objects.filter(user_id=user_id, post=OuterRef('pk')))
+    ).values_list('likes_count', 'stored').first()
+    likes_count, stored = row or (0, False)
+    current = buffer.pending(user_id, [post_id]).get(post_id, stored)
+    if liked is None:
+        liked = not current
+    if liked != current:
+        buffer.record(user_id, post_id, liked)
+    return liked != current, liked, likes_count + int(liked) - int(stored)
+
+
+def add_like(user_id, post_id):
+    """
+    Like post_id as user_id. Returns (created, likes_count); liking an
+    already-liked post is a no-op that returns created=False.
+    """
+    buffer = get_like_buffer()
+    if buffer is not None:
+        created, _, likes_count = _buffer_like(buffer, user_id, post_id, True)
+        return created, likes_count
+    
+    using = router.db_for_write(Like)
+    connection = connections[using]
+    table, user, post, post_timestamp, timestamp = _quoted(
+        connection, Like, 'user', 'post', 'post_timestamp', 'timestamp'
+    )
+    posts, pk, posted_at = _quoted(connection, Post, 'id', 'timestamp')
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user}, {post}, {post_timestamp}, {timestamp}) '
+            f'SELECT %s, {pk}, {posted_at}, %s FROM {posts} WHERE {pk} = %s '
+            f'ON CONFLICT ({user}, {post}, {post_timestamp}) DO NOTHING RETURNING {post}',
+            [user_id, timezone.now(), post_id],
+        )
+        if cursor.fetchone() is None:
+            return False, _current_likes_count(cursor, connection, post_id)
+        likes_count = _bump_likes_count(cursor, connection, post_id, 1)
+        invalidate_feed()
+    return True, likes_count
+
+
+def remove_like(user_id, post_id):
+    """
+    Remove user_id's like from post_id. Returns (deleted, likes_count);
+    unliking a post that is not liked is a no-op that returns deleted=False.
+    """
+    buffer = get_like_buffer()
+    if buffer is not None:
+        deleted, _, likes_count = _buffer_like(buffer, user_id, post_id, False)
+        return deleted, likes_count
+    
+    using = router.db_for_write(Like)
+    connection = connections[using]
+    table, user, post = _quoted(connection, Like, 'user', 'post')
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user} = %s AND {post} = %s RETURNING {post}',
+            [user_id, post_id],
+        )
+        if cursor.fetchone() is None:
+            return False, _current_likes_count(cursor, connection, post_id)
+        likes_count = _bump_likes_count(cursor, connection, post_id, -1)
+        invalidate_feed()
+    return True, likes_count
+
+
+def toggle_like(user_id, post_id):
+    """Unlike if liked, otherwise like. Returns (liked, likes_count)."""
+    buffer = get_like_buffer()
+    if buffer is not None:
+        _, liked, likes_count = _buffer_like(buffer, user_id, post_id)
+        return liked, likes_count
+    
+    deleted, likes_count = remove_like(user_id, post_id)
+    if deleted:
+        return False, likes_count
+    created, likes_count = add_like(user_id, post_id)
+    return True, likes_count
+
+
+def overlay_pending_likes(user_id, posts):
+    """
+    Read-your-writes for buffered likes: given {post_id: post_dict} rendered
+    from the database, apply the user's not-yet-flushed like states to
+    is_liked_by_user and likes_count in place
+    """
+    buffer = get_like_buffer()
+    if buffer is None or not posts:
+        return
+    for post_id, liked in buffer.pending(user_id, posts.keys()).items():
+        post = posts[post_id]
+        if liked != post['is_liked_by_user']:
+            post['likes_count'] += 1 if liked else -1
+            post['is_liked_by_user'] = liked
@@ -0,0 +1,143 @@
+"""
+Live feed events: publish on write, fan out to server-sent-event streams.
+
+Writers publish small JSON events to one Redis pub/sub channel, so an
+event raised on any replica reaches every ASGI worker. Each worker keeps a
+single subscription per event loop and copies frames into a bounded
+asyncio.Queue per connected client; idle clients cost a queue, not a thread.
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = redis.Redis.from_url(settings.REDIS_URL)
+    return _publisher
+
+
+def _publish(message):
+    try:
+        _get_publisher().publish(settings.LIVE_FEED_CHANNEL, message)
+    except redis.RedisError:
+        # Live updates are best effort; never fail the write that raised them
+        logger.warning('Could not publish live feed event', exc_info=True)
+
+
+def publish_event(event, data):
+    """Publish a live feed event once the current transaction commits"""
+    if not settings.LIVE_FEED:
+        return
+    message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: _publish(message))
+
+
+def format_frame(message):
+    """Turn a published message into a text/event-stream frame"""
+    if isinstance(message, bytes):
+        message = message.decode()
+    payload = json.loads(message)
+    return f"event: {payload['event']}\ndata: {json.dumps(payload['data'])}\n\n"
+
+
+class LiveFeedHub:
+    """One Redis subscription fanned out to every client on an event loop"""
+
+    def __init__(self, url, channel, client_buffer):
+        self.url = url
+        self.channel = channel
+        self.client_buffer = client_buffer
+        self._clients = set()
+        self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.client_buffer)
+        self._clients.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._clients.discard(queue)
+
+    def _broadcast(self, frame):
+        for queue in list(self._clients):
+            if queue.full():
+                # Slow reader: drop its oldest frame rather than block everyone
+                queue.get_nowait()
+            queue.put_nowait(frame)
+
+    async def _listen(self):
+        while self._clients:
+            client = aioredis.Redis.from_url(self.url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                while self._clients:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._broadcast(format_frame(message['data']))
+            except (redis.RedisError, OSError):
+                logger.warning('Live feed subscription lost, reconnecting', exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """Return the live feed hub for the running event loop"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = LiveFeedHub(
+            settings.REDIS_URL, settings.LIVE_FEED_CHANNEL, settings.LIVE_FEED_CLIENT_BUFFER
+        )
+    return hub
+
+
+async def event_stream():
+    """
+    Yield SSE frames for one client, with keep-alive comments while idle.
+    Streams end after LIVE_FEED_MAX_SECONDS so that clients that went away
+    without a clean disconnect are released; EventSource reconnects by itself.
+    Subscribes to the hub of the event loop that iterates the stream.
+    """
+    hub = get_hub()
+    queue = hub.subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LIVE_FEED_MAX_SECONDS
+    try:
+        yield f'retry: {settings.LIVE_FEED_RETRY_MS}\n\n'
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                yield await asyncio.wait_for(
+                    queue.get(), timeout=min(settings.LIVE_FEED_HEARTBEAT_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+    finally:
+        hub.unsubscribe(queue)
@@ -0,0 +1,305 @@
+"""
+Management command to benchmark the REST API in-process against the seeded dataset
+"""
+import json
+import random
+import subprocess
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+from moderation.models import Report
+from posts.benchmarks import make_content, summarize_latencies, zipf_cum_weights
+from posts.models import Like, Post
+
+# Reads first so that writes made by later scenarios do not skew them
+SCENARIOS = (
+    'feed_anon',
+    'feed_user',
+    'detail',
+    'comments',
+    'like',
+    'create',
+    'report',
+    'moderation_queue',
+)
+
+
+class Dataset:
+    """Seeded users and posts that scenarios draw from"""
+
+    def __init__(self, prefix, seed, exponent):
+        User = get_user_model()
+        self.users = list(User.objects.filter(username__startswith=f'{prefix}_', is_staff=False).order_by('pk'))
+        self.admin = User.objects.filter(username=f'{prefix}_admin', is_staff=True).first()
+        if not self.users or self.admin is None:
+            raise CommandError(f"No benchmark dataset with prefix '{prefix}'; run seed_benchmark_data first")
+        self.posts = list(
+            Post.objects.visible().filter(user__in=self.users, parent_uuid__isnull=True).order_by('pk')
+        )
+        if not self.posts:
+            raise CommandError(f"The '{prefix}' dataset has no visible posts; reseed with --flush")
+        # Popularity rank is fixed by the seed, independent of age
+        random.Random(seed).shuffle(self.posts)
+        self.cum_weights = zipf_cum_weights(len(self.posts), exponent)
+
+        self._reported = set(
+            Report.objects.filter(reporter__in=self.users).values_list('reporter_id', 'post_id')
+        )
+        self._report_rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # Logging in writes a session, so every user logs in once up front
+        # and request clients reuse the cookie
+        self.session_keys = {}
+        for user in self.users + [self.admin]:
+            client = Client()
+            client.force_login(user)
+            self.session_keys[user.pk] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def popular_post(self, rng):
+        return rng.choices(self.posts, cum_weights=self.cum_weights)[0]
+
+    def fresh_report(self):
+        """A (user, post) pair with no report yet; reports are unique per pair"""
+        with self._lock:
+            for _ in range(100):
+                user = self._report_rng.choice(self.users)
+                post = self._report_rng.choices(self.posts, cum_weights=self.cum_weights)[0]
+                if (user.pk, post.pk) not in self._reported:
+                    self._reported.add((user.pk, post.pk))
+                    return user, post
+        raise CommandError('Ran out of unreported (user, post) pairs; reseed with --flush')
+
+    def counts(self, prefix):
+        posts = Post.objects.filter(user__username__startswith=f'{prefix}_')
+        return {
+            'users': len(self.users),
+            'posts': posts.filter(parent_uuid__isnull=True).count(),
+            'comments': posts.filter(parent_uuid__isnull=False).count(),
+            'hidden_posts': posts.filter(is_hidden=True).count(),
+            'likes': Like.objects.filter(user__in=self.users).count(),
+            'reports': Report.objects.filter(reporter__in=self.users).count(),
+        }
+
+
+def build_request(scenario, dataset, rng, index):
+    """Return (user or None, method, path, data, extra) for one request of scenario"""
+    if scenario == 'feed_anon':
+        # A spread of client addresses, as the anon throttle would see them
+        return None, 'get', '/api/posts/', None, {'REMOTE_ADDR': f'10.0.{index // 250 % 250}.{index % 250 + 1}'}
+    if scenario == 'feed_user':
+        return rng.choice(dataset.users), 'get', '/api/posts/', None, {}
+    if scenario == 'detail':
+        return rng.choice(dataset.users), 'get', f'/api/posts/{dataset.popular_post(rng).pk}/', None, {}
+    if scenario == 'comments':
+        post = dataset.popular_post(rng)
+        return rng.choice(dataset.users), 'get', f'/api/posts/?parent_uuid={post.uuid}', None, {}
+    if scenario == 'like':
+        # Toggling keeps the like count stable across long runs
+        return rng.choice(dataset.users), 'post', f'/api/posts/{dataset.popular_post(rng).pk}/like/', None, {}
+    if scenario == 'create':
+        return rng.choice(dataset.users), 'post', '/api/posts/', {'content': make_content(rng)}, {}
+    if scenario == 'report':
+        user, post = dataset.fresh_report()
+        reason = rng.choice(Report.REASON_CHOICES)[0]
+        return user, 'post', '/api/moderation/reports/', {'post': post.pk, 'reason': reason}, {}
+    if scenario == 'moderation_queue':
+        return dataset.admin, 'get', '/api/moderation/reports/pending/', None, {}
+    raise ValueError(f'Unknown scenario {scenario}')
+
+
+def run_scenario(scenario, dataset, concurrency, total, seed, host):
+    """
+    Issue total requests of scenario from concurrency threads, each with its
+    own logged-in clients and database connections. Returns latencies
+    (seconds), queries per request, status counts and wall time.
+    """
+    latencies = []
+    queries = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(number):
+        rng = random.Random(f'{seed}:{scenario}:{number}')
+        clients = {}
+
+        def client_for(user):
+            key = user.pk if user else None
+            if key not in clients:
+                clients[key] = Client(SERVER_NAME=host, HTTP_ACCEPT='application/json')
+                if user is not None:
+                    clients[key].cookies[settings.SESSION_COOKIE_NAME] = dataset.session_keys[user.pk]
+            return clients[key]
+
+        try:
+            ready.wait()
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                user, method, path, data, extra = build_request(scenario, dataset, rng, index)
+                client = client_for(user)
+                with ExitStack() as stack:
+                    captured = [
+                        stack.enter_context(CaptureQueriesContext(connections[alias]))
+                        for alias in connections
+                    ]
+                    started = time.perf_counter()
+                    response = getattr(client, method)(path, data, **extra)
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(sum(len(context) for context in captured))
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return latencies, queries, statuses, time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percent_change(before, after):
+    if not before:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the feed, detail, like, create, report and moderation endpoints in-process '
+        'against the seed_benchmark_data dataset; report throughput, p50/p95/p99 and queries per request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', dest='scenarios', action='append', choices=SCENARIOS,
+            help='Scenario to run (repeatable; default all)'
+        )
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests per scenario first')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads')
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Username prefix the dataset was seeded with'
+        )
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for picking posts')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument(
+            '--keep-throttles', action='store_true',
+            help='Leave the DRF throttles on (by default every rate is lifted)'
+        )
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'] or SCENARIOS
+        dataset = Dataset(options['prefix'], options['seed'], options['zipf'])
+        baseline = self._load_baseline(options['baseline'])
+
+        if not options['keep_throttles']:
+            # A rate of None lets every request through
+            SimpleRateThrottle.THROTTLE_RATES = {scope: None for scope in SimpleRateThrottle.THROTTLE_RATES}
+
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        results = {}
+        for scenario in scenarios:
+            if options['warmup']:
+                run_scenario(scenario, dataset, options['concurrency'], options['warmup'], options['seed'] - 1, host)
+            latencies, queries, statuses, wall = run_scenario(
+                scenario, dataset, options['concurrency'], options['requests'], options['seed'], host
+            )
+            results[scenario] = {
+                **summarize_latencies(latencies, wall),
+                'queries_mean': round(sum(queries) / len(queries), 2) if queries else 0.0,
+                'queries_max': max(queries, default=0),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            }
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git_commit': git_commit(),
+            'options': {
+                key: options[key]
+                for key in ('requests', 'warmup', 'concurrency', 'prefix', 'zipf', 'seed', 'keep_throttles')
+            },
+            'environment': {
+                'django': django.get_version(),
+                'database': connections['default'].vendor,
+                'databases': list(settings.DATABASES),
+                'cache': settings.CACHES['default']['BACKEND'],
+                'session_engine': settings.SESSION_ENGINE,
+            },
+            'dataset': dataset.counts(options['prefix']),
+            'results': results,
+        }
+
+        self._print(results, baseline)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(f"Wrote {options['output']}")
+        if any(not status.startswith('2') for result in results.values() for status in result['statuses']):
+            self.stdout.write(self.style.WARNING('Some requests did not succeed; see statuses'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmarked {len(results)} scenarios, {options['requests']} requests each "
+            f"at concurrency {options['concurrency']}"
+        ))
+
+    def _load_baseline(self, path):
+        if not path:
+            return {}
+        try:
+            return json.loads(Path(path).read_text())['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Could not read baseline {path}: {error}')
+
+    def _print(self, results, baseline):
+        self.stdout.write(
+            f"{'scenario':18} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}  statuses"
+        )
+        for scenario, result in results.items():
+            self.stdout.write(
+                f"{scenario:18} {result['throughput_rps']:8.1f} {result['p50_ms']:8.2f} "
+                f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} {result['queries_mean']:8.2f}  "
+                f"{result['statuses']}"
+            )
+            before = baseline.get(scenario)
+            if before:
+                changes = []
+                for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                    change = percent_change(before.get(key), result[key])
+                    if change is not None:
+                        changes.append(f"{key} {change:+.1f}%")
+                queries_diff = result['queries_mean'] - before.get('queries_mean', 0)
+                changes.append(f"queries {queries_diff:+.2f}")
+                self.stdout.write(f"{'':18} vs baseline: {', '.join(changes)}")
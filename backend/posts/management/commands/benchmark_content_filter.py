@@ -0,0 +1,85 @@
+"""
+Management command to benchmark censoring (better-profanity + per-word regex loop vs ContentFilter)
+"""
+import random
+import re
+import string
+import time
+
+from better_profanity import profanity
+from django.core.management.base import BaseCommand
+
+from posts.utils import ContentFilter
+
+
+def legacy_censor(text, words):
+    """
+    The previous approach: better-profanity's word-by-word scan, then
+    compile and apply one regex per custom word per call
+    """
+    text = profanity.censor(text, '*')
+    for word, replacement in words:
+        pattern = re.compile(re.escape(word), re.IGNORECASE)
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class Command(BaseCommand):
+    help = 'Compare per-call censoring cost of the legacy two-pass censor and ContentFilter'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--words', type=int, nargs='+', default=[1000, 10000],
+            help='Custom word list sizes to benchmark'
+        )
+        parser.add_argument(
+            '--calls', type=int, default=20,
+            help='Number of censor calls per measurement'
+        )
+        parser.add_argument(
+            '--length', type=int, default=1000,
+            help='Length of each sample text in characters'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+
+        for size in options['words']:
+            words = self._make_words(rng, size)
+            texts = [self._make_text(rng, words, options['length']) for _ in range(options['calls'])]
+
+            start = time.perf_counter()
+            for text in texts:
+                legacy_censor(text, words)
+            legacy = (time.perf_counter() - start) / len(texts)
+
+            start = time.perf_counter()
+            content_filter = ContentFilter(words)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for text in texts:
+                content_filter.censor(text)
+            compiled = (time.perf_counter() - start) / len(texts)
+
+            self.stdout.write(
+                f'{size:>6} words: legacy {legacy * 1000:9.3f} ms/call, '
+                f'compiled {compiled * 1000:7.3f} ms/call '
+                f'(one-off build {build * 1000:.1f} ms, {legacy / compiled:.0f}x faster)'
+            )
+
+    def _make_words(self, rng, size):
+        words = set()
+        while len(words) < size:
+            length = rng.randint(4, 10)
+            words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+        return [(word, '*' * len(word)) for word in sorted(words)]
+
+    def _make_text(self, rng, words, length):
+        tokens = []
+        while sum(len(token) + 1 for token in tokens) < length:
+            if rng.random() < 0.05:
+                tokens.append(rng.choice(words)[0].upper())
+            else:
+                tokens.append(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 8))))
+        return ' '.join(tokens)[:length]
@@ -0,0 +1,125 @@
+"""
+Management command to compare the WSGI and ASGI deployments under the same read load
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import summarize_latencies
+from posts.models import Post
+
+
+def run_load(base_url, paths, concurrency, total, timeout):
+    """
+    Issue total GETs spread round-robin over paths from concurrency threads.
+    Returns latencies (seconds, sorted), status counts and wall time.
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            url = base_url.rstrip('/') + paths[index % len(paths)]
+            request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            except (urllib.error.URLError, OSError):
+                status = 'error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), statuses, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Drive identical read traffic at the WSGI and ASGI deployments and compare throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wsgi-url', default='http://localhost:8000',
+            help='Base URL of the WSGI deployment (config.wsgi)'
+        )
+        parser.add_argument(
+            '--asgi-url', default='http://localhost:8001',
+            help='Base URL of the ASGI deployment (config.asgi)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Concurrent client threads'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Requests per deployment'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Per-request timeout in seconds'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Print results as JSON'
+        )
+
+    def handle(self, *args, **options):
+        paths = self._paths()
+        results = {}
+        for name in ('wsgi', 'asgi'):
+            base_url = options[f'{name}_url']
+            # Warm up connections and caches before measuring
+            run_load(base_url, paths, min(options['concurrency'], 10), len(paths) * 2, options['timeout'])
+            latencies, statuses, wall = run_load(
+                base_url, paths, options['concurrency'], options['requests'], options['timeout']
+            )
+            results[name] = {
+                'url': base_url,
+                'statuses': {str(status): count for status, count in statuses.items()},
+                **summarize_latencies(latencies, wall),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps({'paths': paths, 'results': results}, indent=2))
+            return
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name.upper():4} {result['throughput_rps']:8.1f} req/s  "
+                f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                f"p99 {result['p99_ms']:7.2f} ms  statuses {result['statuses']}"
+            )
+        if any(str(status) == '429' for result in results.values() for status in result['statuses']):
+            self.stdout.write(self.style.WARNING(
+                'Some requests were throttled; raise ANON_THROTTLE_RATE on both deployments'
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Compared {len(paths)} read paths at concurrency {options['concurrency']}"))
+
+    def _paths(self):
+        """Feed, comments, detail and today's topic for posts that exist now"""
+        paths = ['/api/posts/', '/api/topics/today/']
+        post = Post.objects.filter(parent_uuid__isnull=True).order_by('-comments_count', '-timestamp').first()
+        if post is not None:
+            paths.append(f'/api/posts/{post.pk}/')
+            paths.append(f'/api/posts/?parent_uuid={post.uuid}')
+        return paths
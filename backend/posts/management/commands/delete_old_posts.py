@@ -2,22 +2,29 @@
 Management command to delete old posts (can be run manually or via cron)
 """
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 from django.conf import settings
-from datetime import timedelta
-from posts.models import Post
+from posts.expiry import describe_batch, expire_old_posts
 
 
 class Command(BaseCommand):
     help = 'Delete posts older than 24 hours'
     
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.POST_EXPIRY_BATCH_SIZE,
+            help='Maximum number of posts deleted per transaction'
+        )
+    
     def handle(self, *args, **options):
-        time_limit = timezone.now() - timedelta(hours=settings.POST_DELETION_HOURS)
-        old_posts = Post.objects.filter(timestamp__lte=time_limit)
-        count = old_posts.count()
+        dropped, batches = expire_old_posts(batch_size=options['batch_size'])
+        count = sum(batch['posts'] for batch in batches)
+        
+        if dropped:
+            self.stdout.write(f"Dropped {len(dropped)} expired partitions: {', '.join(dropped)}")
+        for batch in batches:
+            self.stdout.write(describe_batch(batch))
         
         if count > 0:
-            old_posts.delete()
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully deleted {count} old posts')
             )
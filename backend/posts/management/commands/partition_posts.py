@@ -0,0 +1,38 @@
+"""
+Management command to switch an existing database to partitioned post storage
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from posts.partitioning import (
+    PartitioningError, convert_to_partitioned, maintain_partitions, partitioning_enabled,
+)
+
+
+class Command(BaseCommand):
+    help = 'Convert posts, likes and reports to hourly/daily range partitions (PostgreSQL only)'
+    
+    def handle(self, *args, **options):
+        if not partitioning_enabled():
+            raise CommandError(
+                'Set POST_PARTITIONING=True and use PostgreSQL to enable partitioned storage'
+            )
+        
+        try:
+            with transaction.atomic():
+                converted = convert_to_partitioned()
+        except PartitioningError as error:
+            raise CommandError(str(error))
+        created, dropped, orphaned = maintain_partitions()
+        
+        if converted:
+            self.stdout.write(
+                self.style.SUCCESS('Successfully converted posts, likes and reports to partitioned tables')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('Posts table is already partitioned')
+            )
+        self.stdout.write(
+            f'Created {len(created)} partitions, dropped {len(dropped)}, '
+            f'deleted {orphaned} orphaned comments'
+        )
@@ -0,0 +1,21 @@
+"""
+Management command to repair drift in the denormalized post counters
+"""
+from django.core.management.base import BaseCommand
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute likes_count and comments_count on posts that have drifted'
+    
+    def handle(self, *args, **options):
+        fixed = Post.objects.all().reconcile_counters()
+        
+        if fixed > 0:
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully reconciled counters on {fixed} posts')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('No counter drift found')
+            )
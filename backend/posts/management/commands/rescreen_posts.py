@@ -0,0 +1,95 @@
+"""
+Management command to re-screen live posts after the filtered word list changes
+"""
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.cache import invalidate_feed
+from posts.models import Post
+from posts.utils import filter_content_batch, invalidate_content_filter
+
+
+class Command(BaseCommand):
+    help = 'Re-run content filtering over all live posts and save censored content'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Number of posts loaded and updated per batch'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Worker processes used to filter posts (one pool for the whole run)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would change without saving'
+        )
+    
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        time_limit = timezone.now() - timedelta(hours=settings.POST_DELETION_HOURS)
+        live_posts = Post.objects.filter(timestamp__gt=time_limit).order_by('id')
+        
+        # Make sure this run sees the latest FilteredWord rows
+        invalidate_content_filter()
+        
+        # Posts whose content has been handed to the filter, in order
+        in_flight = deque()
+        
+        def contents():
+            for post in self._iter_posts(live_posts, chunk_size):
+                in_flight.append(post)
+                yield post.content
+        
+        # One call (and so one process pool) for the whole run
+        results = filter_content_batch(
+            contents(),
+            processes=options['processes'],
+            chunk_size=max(1, chunk_size // max(1, options['processes'])),
+        )
+        
+        scanned = updated = flagged = 0
+        changed = []
+        for filtered, violations in results:
+            post = in_flight.popleft()
+            scanned += 1
+            if violations:
+                flagged += 1
+            elif filtered != post.content:
+                post.content = filtered
+                changed.append(post)
+            if len(changed) >= chunk_size:
+                updated += self._save(changed, options['dry_run'])
+                changed = []
+        updated += self._save(changed, options['dry_run'])
+        
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Scanned {scanned} live posts. {verb} {updated}; '
+                f'{flagged} contain prohibited items and were left unchanged'
+            )
+        )
+    
+    def _iter_posts(self, live_posts, chunk_size):
+        """Yield live posts in id order, loading chunk_size at a time"""
+        last_id = 0
+        while True:
+            batch = list(
+                live_posts.filter(id__gt=last_id).only('id', 'content')[:chunk_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield from batch
+    
+    def _save(self, changed, dry_run):
+        if changed and not dry_run:
+            Post.objects.bulk_update(changed, ['content'])
+            invalidate_feed()
+        return len(changed)
@@ -0,0 +1,219 @@
+"""
+Management command to seed a reproducible benchmark dataset
+"""
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from moderation.models import Report
+from moderation.scoring import report_weight
+from posts.benchmarks import make_content, zipf_cum_weights
+from posts.cache import invalidate_feed
+from posts.expiry import delete_posts
+from posts.models import Like, Post, Topic
+from posts.utils import generate_random_color
+
+REASON_WEIGHTS = {
+    'spam': 50,
+    'harassment': 15,
+    'hate_speech': 10,
+    'violence': 5,
+    'self_harm': 5,
+    'other': 15,
+}
+
+# Posts are spread over the last day, short of the expiry window
+SPREAD = timedelta(hours=23)
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def unique_pairs(rng, users, targets, cum_weights, total):
+    """
+    Up to total distinct (user, target) pairs with targets drawn by Zipf
+    rank, in a stable order so that a seed always yields the same dataset
+    """
+    ranks = range(len(targets))
+    pairs = set()
+    attempts = 0
+    while len(pairs) < total and attempts < total * 5:
+        attempts += 1
+        pairs.add((rng.randrange(len(users)), rng.choices(ranks, cum_weights=cum_weights)[0]))
+    return [(users[user], targets[target]) for user, target in sorted(pairs)]
+
+
+class Command(BaseCommand):
+    help = 'Seed users, posts over the last 24h, comment trees, Zipfian likes and reports for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Users to create')
+        parser.add_argument('--posts', type=int, default=2000, help='Top-level posts')
+        parser.add_argument('--comments', type=int, default=6000, help='Comments, nested into threads')
+        parser.add_argument('--likes', type=int, default=30000, help='Likes, Zipf-distributed over posts')
+        parser.add_argument('--reports', type=int, default=1000, help='Reports, Zipf-distributed over posts')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Zipf exponent for post popularity (higher concentrates activity)'
+        )
+        parser.add_argument(
+            '--reply-ratio', type=float, default=0.3,
+            help='Share of comments that reply to another comment rather than a post'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Username prefix identifying the benchmark dataset'
+        )
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Delete the existing dataset with this prefix first'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        started = time.perf_counter()
+
+        if options['flush']:
+            self._flush(prefix)
+
+        now = timezone.now()
+        Topic.objects.get_or_create(
+            date=now.date(), defaults={'topic': 'What made you smile today?'}
+        )
+
+        users = self._create_users(prefix, options['users'])
+        posts = self._create_posts(rng, users, options['posts'], now)
+        comments = self._create_comments(
+            rng, users, posts, options['comments'], options['reply_ratio'], options['zipf'], now
+        )
+
+        # Popularity rank is independent of age
+        ranked = posts + comments
+        rng.shuffle(ranked)
+        cum_weights = zipf_cum_weights(len(ranked), options['zipf'])
+
+        like_pairs = unique_pairs(rng, users, ranked, cum_weights, options['likes'])
+        Like.objects.bulk_create(
+            [Like(user=user, post=post, post_timestamp=post.timestamp) for user, post in like_pairs],
+            batch_size=2000, ignore_conflicts=True,
+        )
+
+        report_pairs = unique_pairs(
+            rng, users, posts, zipf_cum_weights(len(posts), options['zipf']), options['reports']
+        )
+        reasons, weights = zip(*REASON_WEIGHTS.items())
+        reports = [
+            Report(
+                post=post, post_timestamp=post.timestamp, reporter=user,
+                reason=rng.choices(reasons, weights=weights)[0],
+            )
+            for user, post in report_pairs
+        ]
+        Report.objects.bulk_create(reports, batch_size=2000)
+
+        with transaction.atomic():
+            Post.objects.filter(pk__in=[post.pk for post in ranked]).reconcile_counters()
+            self._apply_report_totals(reports)
+        invalidate_feed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, {len(posts)} posts, {len(comments)} comments, "
+            f"{len(like_pairs)} likes and {len(reports)} reports "
+            f"(prefix '{prefix}', admin '{prefix}_admin', password '{BENCHMARK_PASSWORD}') "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _flush(self, prefix):
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        post_ids = list(Post.objects.filter(user__in=users).values_list('id', flat=True))
+        with transaction.atomic():
+            for start in range(0, len(post_ids), 1000):
+                delete_posts(post_ids[start:start + 1000])
+            users.delete()
+        self.stdout.write(f"Flushed {len(post_ids)} posts and the '{prefix}' users")
+
+    def _create_users(self, prefix, count):
+        User = get_user_model()
+        # Hashing once keeps seeding fast; every benchmark user shares it
+        password = make_password(BENCHMARK_PASSWORD)
+        users = [User(username=f'{prefix}_{index}', password=password) for index in range(count)]
+        users.append(User(username=f'{prefix}_admin', password=password, is_staff=True))
+        User.objects.bulk_create(users, batch_size=1000, ignore_conflicts=True)
+        return list(User.objects.filter(username__startswith=f'{prefix}_', is_staff=False).order_by('pk'))
+
+    def _create_posts(self, rng, users, count, now):
+        posts = [
+            Post(user=rng.choice(users), content=make_content(rng), avatar_color=generate_random_color())
+            for _ in range(count)
+        ]
+        Post.objects.bulk_create(posts, batch_size=1000)
+        # timestamp is auto_now_add, so the spread is applied afterwards
+        for post in posts:
+            post.timestamp = now - rng.random() * SPREAD
+        Post.objects.bulk_update(posts, ['timestamp'], batch_size=1000)
+        return posts
+
+    def _create_comments(self, rng, users, posts, count, reply_ratio, exponent, now):
+        """
+        Comments arrive in waves so that each wave can reply to comments
+        saved (and given ids) by earlier ones, building threads several
+        levels deep
+        """
+        cum_weights = zipf_cum_weights(len(posts), exponent)
+        ranked = posts[:]
+        rng.shuffle(ranked)
+        comments = []
+        waves = 4
+        for wave in range(waves):
+            size = count // waves + (1 if wave < count % waves else 0)
+            batch, parents = [], []
+            for _ in range(size):
+                if comments and rng.random() < reply_ratio:
+                    parent = rng.choice(comments)
+                else:
+                    parent = rng.choices(ranked, cum_weights=cum_weights)[0]
+                # bulk_create skips Post.save, so parent_id is set here
+                batch.append(Post(
+                    user=rng.choice(users),
+                    content=make_content(rng, 3, 20),
+                    avatar_color=generate_random_color(),
+                    parent_uuid=parent.uuid,
+                    parent_id=parent.pk,
+                ))
+                parents.append(parent)
+            Post.objects.bulk_create(batch, batch_size=1000)
+            # A reply lands between its parent and now
+            for comment, parent in zip(batch, parents):
+                comment.timestamp = parent.timestamp + rng.random() * (now - parent.timestamp)
+            Post.objects.bulk_update(batch, ['timestamp'], batch_size=1000)
+            comments += batch
+        return comments
+
+    def _apply_report_totals(self, reports):
+        """Set the report totals and is_hidden as record_report would have"""
+        counts = Counter(report.post_id for report in reports)
+        scores = Counter()
+        latest = {}
+        for report in reports:
+            scores[report.post_id] += report_weight(report.reason)
+            latest[report.post_id] = max(latest.get(report.post_id, report.timestamp), report.timestamp)
+        posts = list(Post.objects.filter(pk__in=counts))
+        for post in posts:
+            post.report_count = counts[post.pk]
+            post.report_score = scores[post.pk]
+            post.latest_report_at = latest[post.pk]
+            post.is_hidden = bool(
+                (settings.AUTO_HIDE_REPORT_COUNT and post.report_count >= settings.AUTO_HIDE_REPORT_COUNT)
+                or (settings.AUTO_HIDE_REPORT_SCORE and post.report_score >= settings.AUTO_HIDE_REPORT_SCORE)
+            )
+        Post.objects.bulk_update(posts, ['report_count', 'report_score', 'latest_report_at', 'is_hidden'], batch_size=1000)
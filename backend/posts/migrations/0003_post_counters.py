@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:07
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Populate the new counter columns from existing likes and comments"""
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('posts', 'Like')
+    
+    likes = Like.objects.filter(
+        post=OuterRef('pk')
+    ).order_by().values('post').annotate(total=Count('id')).values('total')
+    comments = Post.objects.filter(
+        parent_uuid=OuterRef('uuid')
+    ).order_by().values('parent_uuid').annotate(total=Count('id')).values('total')
+    
+    Post.objects.update(
+        likes_count=Coalesce(Subquery(likes, output_field=IntegerField()), 0),
+        comments_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
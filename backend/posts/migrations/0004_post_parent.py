@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:30
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_parent(apps, schema_editor):
+    """Point every comment at its parent's id, resolved from parent_uuid"""
+    Post = apps.get_model('posts', 'Post')
+    
+    Post.objects.filter(parent_uuid__isnull=False).update(
+        parent_id=Subquery(
+            Post.objects.filter(uuid=OuterRef('parent_uuid')).values('id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_timesta_610d3f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_parent__d6b7be_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_uuid_977782_idx',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='replies', to='posts.post'),
+        ),
+        migrations.RunPython(backfill_parent, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['parent', '-timestamp', '-id'], name='posts_parent_timestamp_idx'),
+        ),
+    ]
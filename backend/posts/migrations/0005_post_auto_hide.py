@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_hidden',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='report_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='report_score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('parent_uuid__isnull', True)), fields=['-timestamp', '-id'], name='posts_visible_timestamp_idx'),
+        ),
+    ]
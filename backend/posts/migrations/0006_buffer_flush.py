@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_auto_hide'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BufferFlush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'buffer_flushes',
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+import uuid
+
+
+def copy_post_timestamps(apps, schema_editor):
+    """Copy each like's post timestamp into post_timestamp"""
+    Like = apps.get_model('posts', 'Like')
+    Post = apps.get_model('posts', 'Post')
+    
+    Like.objects.update(
+        post_timestamp=Subquery(
+            Post.objects.filter(pk=OuterRef('post_id')).values('timestamp')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_buffer_flush'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='like',
+            name='post_timestamp',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_post_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='like',
+            name='post_timestamp',
+            field=models.DateTimeField(editable=False),
+        ),
+        # The existing foreign key stays in the database; partitioning
+        # replaces it with one on (post_id, post_timestamp)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='like',
+                    name='post',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='posts.post'),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='like',
+            unique_together={('user', 'post', 'post_timestamp')},
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.UniqueConstraint(fields=('uuid', 'timestamp'), name='posts_uuid_timestamp_uniq'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_like_post_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='latest_report_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('report_count__gt', 0)), fields=['-latest_report_at', '-id'], name='posts_reported_idx'),
+        ),
+    ]
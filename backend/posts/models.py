@@ -2,11 +2,15 @@
 Models for posts, comments, topics, and likes
 """
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 
+from .cache import invalidate_feed
+
 
 class Topic(models.Model):
     """Daily/weekly topic suggestions"""
@@ -22,13 +26,85 @@ class Topic(models.Model):
         return f"{self.date}: {self.topic}"
 
 
+class PostQuerySet(models.QuerySet):
+    """QuerySet helpers for rendering posts without per-row queries"""
+    
+    def with_feed_annotations(self, user=None):
+        """
+        Annotate is_liked_by_user so that PostSerializer can render a page
+        with a constant number of queries (counts are stored on the row)
+        """
+        if user is not None and user.is_authenticated:
+            return self.annotate(
+                is_liked_by_user=Exists(
+                    Like.objects.filter(user=user, post=OuterRef('pk'))
+                )
+            )
+        return self.annotate(is_liked_by_user=Value(False))
+    
+    def visible(self):
+        """Posts not auto-hidden by reports"""
+        return self.filter(is_hidden=False)
+    
+    def reported(self):
+        """Posts with reports awaiting review (the posts_reported_idx rows)"""
+        return self.filter(report_count__gt=0)
+    
+    def reconcile_counters(self):
+        """
+        Recompute likes_count and comments_count from the source rows in
+        one set-based UPDATE. Returns the number of drifted rows fixed.
+        """
+        likes = Like.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(total=Count('id')).values('total')
+        comments = Post.objects.filter(
+            parent=OuterRef('pk')
+        ).order_by().values('parent').annotate(total=Count('id')).values('total')
+        
+        actual_likes = Coalesce(Subquery(likes, output_field=IntegerField()), 0)
+        actual_comments = Coalesce(Subquery(comments, output_field=IntegerField()), 0)
+        
+        drifted = self.annotate(
+            actual_likes=actual_likes,
+            actual_comments=actual_comments,
+        ).exclude(
+            likes_count=F('actual_likes'),
+            comments_count=F('actual_comments'),
+        )
+        fixed = Post.objects.filter(pk__in=drifted.values('pk')).update(
+            likes_count=actual_likes,
+            comments_count=actual_comments,
+        )
+        if fixed:
+            invalidate_feed()
+        return fixed
+    
+    def delete(self):
+        """Delete posts and decrement comments_count on surviving parents"""
+        with transaction.atomic():
+            parent_counts = list(
+                self.filter(parent__isnull=False).order_by().values(
+                    'parent'
+                ).annotate(total=Count('id'))
+            )
+            result = super().delete()
+            for row in parent_counts:
+                Post.objects.filter(pk=row['parent']).update(
+                    comments_count=F('comments_count') - row['total']
+                )
+            invalidate_feed()
+        return result
+
+
 class Post(models.Model):
     """
     Post model for anonymous posts and comments.
     Comments are posts with a parent_uuid.
     """
     id = models.AutoField(primary_key=True)  # Explicit primary key
-    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
+    # Unique per (uuid, timestamp), see Meta.constraints
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -46,21 +122,65 @@ class Post(models.Model):
     
     # For nested comments - parent_uuid links to another post
     parent_uuid = models.UUIDField(null=True, blank=True, db_index=True)
+    # Integer copy of the same link for joins and the (parent, timestamp)
+    # index. No DB constraint: comments may outlive their parent until the
+    # expiry task sweeps orphans.
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='replies'
+    )
     
     # Metadata
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     views = models.IntegerField(default=0)
     
+    # Denormalized counters, maintained with atomic F() updates
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    
+    # Reports since the last moderator review (moderation/scoring.py); past
+    # the AUTO_HIDE thresholds the post is hidden from the feed
+    report_count = models.IntegerField(default=0, editable=False)
+    report_score = models.IntegerField(default=0, editable=False)
+    is_hidden = models.BooleanField(default=False, editable=False)
+    # Newest of those reports; orders the moderation queue
+    latest_report_at = models.DateTimeField(null=True, editable=False)
+    
     # Random avatar/color for visual anonymity
     avatar_color = models.CharField(max_length=7, default='#6366f1')
     
+    objects = PostQuerySet.as_manager()
+    
     class Meta:
         db_table = 'posts'
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['-timestamp']),
-            models.Index(fields=['parent_uuid']),
-            models.Index(fields=['uuid']),
+            # Comment threads, newest first, in keyset order
+            models.Index(fields=['parent', '-timestamp', '-id'], name='posts_parent_timestamp_idx'),
+            # Top-level feed, newest first, without auto-hidden posts
+            models.Index(
+                fields=['-timestamp', '-id'],
+                condition=models.Q(parent_uuid__isnull=True, is_hidden=False),
+                name='posts_visible_timestamp_idx',
+            ),
+            # Moderation queue: reported posts, most recently reported first
+            models.Index(
+                fields=['-latest_report_at', '-id'],
+                condition=models.Q(report_count__gt=0),
+                name='posts_reported_idx',
+            ),
+        ]
+        constraints = [
+            # Partitioned tables (posts/partitioning.py) only allow unique
+            # constraints that include the partition key; uuid4 values do not
+            # collide, and this index also serves lookups by uuid alone
+            models.UniqueConstraint(fields=['uuid', 'timestamp'], name='posts_uuid_timestamp_uniq'),
         ]
     
     def __str__(self):
@@ -83,17 +203,24 @@ class Post(models.Model):
         time_limit = timezone.now() - timedelta(hours=settings.POST_DELETION_HOURS)
         return self.timestamp <= time_limit
     
-    @property
-    def likes_count(self):
-        """Get total likes count"""
-        return self.likes.count()
+    def save(self, *args, **kwargs):
+        """Resolve parent from parent_uuid when a comment is first saved"""
+        if self.parent_uuid is not None and self.parent_id is None:
+            self.parent_id = Post.objects.filter(
+                uuid=self.parent_uuid
+            ).values_list('id', flat=True).first()
+        super().save(*args, **kwargs)
     
-    @property
-    def comments_count(self):
-        """Get total comments count (only for parent posts)"""
-        if self.is_comment:
-            return 0
-        return Post.objects.filter(parent_uuid=self.uuid).count()
+    def delete(self, *args, **kwargs):
+        """Delete the post and keep the parent's comments_count in step"""
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.parent_id is not None:
+                Post.objects.filter(pk=self.parent_id).update(
+                    comments_count=F('comments_count') - 1
+                )
+            invalidate_feed()
+        return result
 
 
 class Like(models.Model):
@@ -105,20 +232,46 @@ class Like(models.Model):
         on_delete=models.CASCADE,
         related_name='likes'
     )
+    # The database foreign key is maintained by migrations and, once posts
+    # are partitioned, references (post_id, post_timestamp)
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='likes'
     )
+    # Copy of post.timestamp: likes are partitioned along with their post
+    post_timestamp = models.DateTimeField(editable=False)
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'likes'
-        unique_together = ['user', 'post']
+        unique_together = ['user', 'post', 'post_timestamp']
         ordering = ['-timestamp']
     
     def __str__(self):
         return f"Like by {self.user.username} on {self.post.uuid}"
+    
+    def save(self, *args, **kwargs):
+        """Copy the post's timestamp when the like is first saved"""
+        if self.post_timestamp is None:
+            self.post_timestamp = self.post.timestamp
+        super().save(*args, **kwargs)
+
+
+class BufferFlush(models.Model):
+    """
+    A flushed batch of buffered writes (posts/buffers.py), recorded in the
+    same transaction as its changes so that no batch is applied twice
+    """
+    token = models.CharField(max_length=32, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'buffer_flushes'
+
+    def __str__(self):
+        return f"Flush {self.token}"
 
 
 class FilteredWord(models.Model):
@@ -0,0 +1,132 @@
+"""
+Pagination classes for the post feed
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class PostCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (timestamp, id) for the post feed.
+
+    Each page is a single indexed range scan on -timestamp: there is no
+    COUNT(*) and no OFFSET, so deep pages cost the same as the first one.
+    The cursor position encodes both the timestamp and the id of the
+    boundary row, which keeps ordering stable when timestamps collide.
+    Subclasses can page over other (datetime, integer) pairs, including
+    annotations, by overriding timestamp_field and id_field.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    timestamp_field = 'timestamp'
+    id_field = 'id'
+    ordering = ('-timestamp', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset for async views, fetching the page with the async ORM"""
+        queryset = self._page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self._set_page([post async for post in queryset])
+
+    def first_page(self, queryset, page_size=None):
+        """
+        First page of queryset, for embedding a page inside another
+        response (e.g. comments in a post detail). Set base_url before
+        asking for get_next_link().
+        """
+        self.page_size = page_size or self.page_size
+        self.cursor = None
+        self._reverse, self._position = False, None
+        queryset = queryset.order_by(*self.ordering)[:self.page_size + 1]
+        return self._set_page(list(queryset))
+
+    def _page_queryset(self, queryset, request):
+        """Order, filter and slice queryset for the requested cursor (no query yet)"""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+        self._reverse, self._position = reverse, current_position
+
+        # Feed order is newest first; a reverse cursor walks back towards newer rows
+        timestamp_field, id_field = self.timestamp_field, self.id_field
+        if reverse:
+            queryset = queryset.order_by(timestamp_field, id_field)
+        else:
+            queryset = queryset.order_by(f'-{timestamp_field}', f'-{id_field}')
+
+        if current_position is not None:
+            timestamp, pk = self._parse_position(current_position)
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{timestamp_field}__{lookup}': timestamp})
+                | Q(**{timestamp_field: timestamp, f'{id_field}__{lookup}': pk})
+            )
+
+        # Fetch one extra row to find out whether another page follows
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse, current_position = self._reverse, self._position
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            timestamp, pk = instance[self.timestamp_field], instance[self.id_field]
+        else:
+            timestamp, pk = getattr(instance, self.timestamp_field), getattr(instance, self.id_field)
+        return f"{timestamp.isoformat()}|{pk}"
+
+    def _parse_position(self, position):
+        """Split an encoded 'timestamp|id' position back into its parts"""
+        try:
+            raw_timestamp, raw_pk = position.rsplit('|', 1)
+            timestamp = parse_datetime(raw_timestamp)
+            pk = int(raw_pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
@@ -0,0 +1,398 @@
+"""
+Optional time-partitioned storage for posts on PostgreSQL.
+
+With POST_PARTITIONING enabled, manage.py partition_posts rebuilds posts
+and the tables depending on it (likes, reports) as tables range-partitioned
+on the post's timestamp, hourly or daily. Likes and reports carry a copy of
+it in post_timestamp, so all of them share partition bounds: expiring an
+interval is a DROP TABLE of its partitions instead of row-by-row DELETEs,
+and the foreign keys to posts are kept.
+
+PostgreSQL requires the partition key in every primary key, unique
+constraint and referenced key, so the models only declare constraints that
+hold in both layouts (uuid is unique per timestamp, likes and reports per
+post_timestamp) and leave the foreign keys to posts to the database. Once
+converted, each primary key also includes its partition key and likes and
+reports reference posts on (id, timestamp). Django's migration state cannot
+express either, so a migration that alters those keys needs its own SQL for
+partitioned databases.
+
+Rows outside every range partition land in a DEFAULT partition and are
+moved out of it when the partition for their interval is created.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidate_feed
+from .expiry import dependent_relations, expire_orphaned_comments
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {
+    'hour': (timedelta(hours=1), '%Y%m%d%H'),
+    'day': (timedelta(days=1), '%Y%m%d'),
+}
+
+
+class PartitioningError(Exception):
+    """The database cannot be converted to partitioned storage"""
+
+
+def partitioning_enabled(conn=connection):
+    return settings.POST_PARTITIONING and conn.vendor == 'postgresql'
+
+
+def is_partitioned(conn=connection):
+    """Whether posts has been converted to a partitioned table"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)",
+            [f'"{Post._meta.db_table}"'],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def partitioned_tables():
+    """
+    [(table, partition key, primary key, column referencing posts)] for
+    posts and every model that depends on it, posts first. Dependents are
+    partitioned on their post_timestamp copy of the post's timestamp.
+    """
+    tables = [(
+        Post._meta.db_table,
+        Post._meta.get_field('timestamp').column,
+        Post._meta.pk.column,
+        None,
+    )]
+    for relation in dependent_relations():
+        model = relation.related_model
+        if model is Post:
+            # Comments live in posts itself
+            continue
+        tables.append((
+            model._meta.db_table,
+            model._meta.get_field('post_timestamp').column,
+            model._meta.pk.column,
+            relation.field.column,
+        ))
+    return tables
+
+
+def _interval():
+    return INTERVALS[settings.POST_PARTITION_INTERVAL]
+
+
+def _floor(moment):
+    """Start of the partition interval containing moment (UTC)"""
+    moment = moment.astimezone(dt_timezone.utc)
+    if settings.POST_PARTITION_INTERVAL == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _partition_name(table, start):
+    return f'{table}_p{start.strftime(_interval()[1])}'
+
+
+def _partition_start(table, name):
+    """Parse the interval start back out of a partition name, or None"""
+    prefix = f'{table}_p'
+    if not name.startswith(prefix):
+        return None
+    try:
+        start = datetime.strptime(name[len(prefix):], _interval()[1])
+    except ValueError:
+        return None
+    return start.replace(tzinfo=dt_timezone.utc)
+
+
+def list_partitions(table, conn=connection):
+    """Return {partition_name: interval_start} for the range partitions of table"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [f'"{table}"'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        start = _partition_start(table, name)
+        if start is not None:
+            partitions[name] = start
+    return partitions
+
+
+def _foreign_keys(cursor, table, referenced):
+    """Names of the foreign keys from table to referenced"""
+    cursor.execute(
+        """
+        SELECT conname FROM pg_constraint
+        WHERE contype = 'f' AND conrelid = to_regclass(%s) AND confrelid = to_regclass(%s)
+        """,
+        [f'"{table}"', f'"{referenced}"'],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _default_holds_rows(cursor, table, key, start, end):
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM "{table}_default" WHERE "{key}" >= %s AND "{key}" < %s)',
+        [start, end],
+    )
+    return cursor.fetchone()[0]
+
+
+def _create_partition(cursor, table, start, end):
+    cursor.execute(
+        f'CREATE TABLE "{_partition_name(table, start)}" PARTITION OF "{table}" '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        [start, end],
+    )
+
+
+def _split_defaults(cursor, tables, missing, start, end):
+    """
+    Create the missing partitions for [start, end) while DEFAULT partitions
+    hold rows in that range, which PostgreSQL refuses to do directly: the
+    DEFAULT partitions are detached, the partitions created, the rows moved
+    over, and the DEFAULT partitions attached again (which re-validates
+    them). Splitting posts detaches every dependent's DEFAULT partition
+    too, without its foreign key to posts, which would otherwise keep
+    posts' from being detached; attaching restores it.
+    """
+    posts_table = tables[0][0]
+    splitting_posts = any(table == posts_table for table, *_ in missing)
+    detached = tables[::-1] if splitting_posts else missing
+    for table, *_ in detached:
+        cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{table}_default"')
+        if splitting_posts and table != posts_table:
+            for name in _foreign_keys(cursor, f'{table}_default', posts_table):
+                cursor.execute(f'ALTER TABLE "{table}_default" DROP CONSTRAINT "{name}"')
+    for table, key, *_ in missing:
+        _create_partition(cursor, table, start, end)
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{table}_default" WHERE "{key}" >= %s AND "{key}" < %s '
+            f'RETURNING *) INSERT INTO "{table}" SELECT * FROM moved',
+            [start, end],
+        )
+    for table, *_ in reversed(detached):
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{table}_default" DEFAULT')
+
+
+def create_partitions(start, end, conn=connection):
+    """
+    Create the missing partitions covering [start, end) for posts and its
+    dependents, moving any rows in their range out of the DEFAULT
+    partitions. Returns the names of the partitions created.
+    """
+    tables = partitioned_tables()
+    existing = set()
+    for table, *_ in tables:
+        existing.update(list_partitions(table, conn))
+    step = _interval()[0]
+    created = []
+    current = _floor(start)
+    with conn.cursor() as cursor:
+        while current < end:
+            missing = [row for row in tables if _partition_name(row[0], current) not in existing]
+            if any(
+                _default_holds_rows(cursor, table, key, current, current + step)
+                for table, key, *_ in missing
+            ):
+                _split_defaults(cursor, tables, missing, current, current + step)
+            else:
+                for table, *_ in missing:
+                    _create_partition(cursor, table, current, current + step)
+            created += [_partition_name(table, current) for table, *_ in missing]
+            current += step
+    return created
+
+
+def drop_expired_partitions(cutoff, conn=connection):
+    """
+    Drop every partition whose whole interval is at or before cutoff,
+    dependents' before posts'. Each is detached first, which fails if rows
+    outside it still reference its posts.
+    """
+    step = _interval()[0]
+    dropped = []
+    with conn.cursor() as cursor:
+        for table, *_ in reversed(partitioned_tables()):
+            partitions = sorted(list_partitions(table, conn).items(), key=lambda item: item[1])
+            for name, start in partitions:
+                if start + step <= cutoff:
+                    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                    cursor.execute(f'DROP TABLE "{name}"')
+                    dropped.append(name)
+    return dropped
+
+
+def maintain_partitions(now=None, sweep_orphans=True):
+    """
+    Create the partitions for every interval from the POST_DELETION_HOURS
+    cutoff to POST_PARTITIONS_AHEAD intervals ahead (recovering rows that
+    reached the DEFAULT partitions while maintenance was not running), drop
+    the ones wholly before the cutoff, then (with sweep_orphans) delete the
+    comments whose parent was dropped. Returns (created, dropped, orphaned
+    comments deleted).
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=settings.POST_DELETION_HOURS)
+    step = _interval()[0]
+    with transaction.atomic():
+        created = create_partitions(cutoff, _floor(now) + step * (settings.POST_PARTITIONS_AHEAD + 1))
+        dropped = drop_expired_partitions(cutoff)
+    orphaned = 0
+    if dropped:
+        invalidate_feed()
+    if dropped and sweep_orphans:
+        batches = expire_orphaned_comments(settings.POST_EXPIRY_BATCH_SIZE)
+        orphaned = sum(batch['posts'] for batch in batches)
+    logger.info('Partitions created=%s dropped=%s orphaned=%s', created, dropped, orphaned)
+    return created, dropped, orphaned
+
+
+def _table_definitions(cursor, table):
+    """
+    What convert_to_partitioned rebuilds for table: its primary key name,
+    {name: definition} of its unique constraints and foreign keys, the
+    indexes that do not back a constraint, and its identity sequence
+    """
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f')
+        """,
+        [f'"{table}"'],
+    )
+    rows = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s) AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint c
+            WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid
+        )
+        """,
+        [f'"{table}"'],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    return {
+        'primary_key': next(name for name, kind, _ in rows if kind == 'p'),
+        'constraints': {name: definition for name, kind, definition in rows if kind != 'p'},
+        'indexes': indexes,
+    }
+
+
+def _serial_sequence(cursor, table, column):
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [f'"{table}"', column])
+    return cursor.fetchone()[0]
+
+
+def convert_to_partitioned(conn=connection):
+    """
+    Rebuild posts and its dependents as range-partitioned tables with the
+    same rows, defaults, identity sequences, indexes and constraints, except
+    that primary keys gain the partition key and foreign keys to posts
+    become (post_id, post_timestamp). Runs in the caller's transaction and
+    holds exclusive locks while copying, so run it in a maintenance window.
+    Returns False if posts is already partitioned.
+    """
+    if is_partitioned(conn):
+        return False
+    tables = partitioned_tables()
+    posts_table, posts_key, posts_pk, _ = tables[0]
+    names = [table for table, *_ in tables]
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'LOCK TABLE ' + ', '.join(f'"{table}"' for table in names) + ' IN ACCESS EXCLUSIVE MODE'
+        )
+
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = ANY(%s::regclass[])
+            AND NOT conrelid = ANY(%s::regclass[])
+            """,
+            [names, names],
+        )
+        outside = [f'{table}.{name}' for table, name in cursor.fetchall()]
+        if outside:
+            raise PartitioningError(
+                f"Foreign keys from tables that are not partitioned would break: {', '.join(outside)}"
+            )
+
+        definitions = {}
+        for table, key, pk, post_column in tables:
+            definitions[table] = _table_definitions(cursor, table)
+            if post_column is not None:
+                # Replaced by a foreign key on (post_id, post_timestamp)
+                post_keys = _foreign_keys(cursor, table, posts_table)
+                for name in post_keys:
+                    del definitions[table]['constraints'][name]
+                name = post_keys[0] if post_keys else f'{table}_{post_column}_fk_{posts_table}'
+                definitions[table]['constraints'][name] = (
+                    f'FOREIGN KEY ("{post_column}", "{key}") '
+                    f'REFERENCES "{posts_table}" ("{posts_pk}", "{posts_key}") '
+                    f'DEFERRABLE INITIALLY DEFERRED'
+                )
+            definitions[table]['sequence'] = _serial_sequence(cursor, table, pk)
+
+        for table, key, pk, _ in tables:
+            legacy = f'{table}_unpartitioned'
+            cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+            cursor.execute(
+                f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS '
+                f'INCLUDING CONSTRAINTS INCLUDING IDENTITY) PARTITION BY RANGE ("{key}")'
+            )
+            cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+        cursor.execute(f'SELECT MIN("{posts_key}") FROM "{posts_table}_unpartitioned"')
+        oldest = cursor.fetchone()[0] or timezone.now()
+        create_partitions(
+            oldest,
+            _floor(timezone.now()) + _interval()[0] * (settings.POST_PARTITIONS_AHEAD + 1),
+            conn,
+        )
+
+        for table, key, pk, _ in tables:
+            cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{table}_unpartitioned"')
+            legacy_sequence = definitions[table]['sequence']
+            if legacy_sequence:
+                # The new identity has its own sequence; continue where the old one was
+                cursor.execute(f'SELECT last_value, is_called FROM {legacy_sequence}')
+                last_value, is_called = cursor.fetchone()
+                cursor.execute(
+                    'SELECT setval(%s, %s, %s)',
+                    [_serial_sequence(cursor, table, pk), last_value, is_called],
+                )
+        for table in reversed(names):
+            cursor.execute(f'DROP TABLE "{table}_unpartitioned"')
+
+        for table, key, pk, _ in tables:
+            table_definitions = definitions[table]
+            cursor.execute(
+                f'ALTER TABLE "{table}" ADD CONSTRAINT "{table_definitions["primary_key"]}" '
+                f'PRIMARY KEY ("{pk}", "{key}")'
+            )
+            for name, definition in table_definitions['constraints'].items():
+                cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+            for definition in table_definitions['indexes']:
+                cursor.execute(definition)
+            if table_definitions['sequence']:
+                cursor.execute(
+                    f'ALTER SEQUENCE {_serial_sequence(cursor, table, pk)} RENAME TO '
+                    f'{table_definitions["sequence"].rsplit(".", 1)[-1]}'
+                )
+    return True
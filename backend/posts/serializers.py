@@ -1,15 +1,27 @@
 """
 Serializers for posts, comments, likes, and topics
 """
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
 from rest_framework import serializers
+
+from config.instrumentation import InstrumentedSerializerMixin
+from .cache import invalidate_feed
 from .models import Post, Like, Topic
+from .pagination import PostCursorPagination
 from .utils import filter_content, generate_random_color
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer for posts and comments"""
     likes_count = serializers.IntegerField(read_only=True)
-    comments_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.SerializerMethodField()
+    # Direct replies to the post or comment, from the stored counter
+    replies_count = serializers.IntegerField(source='comments_count', read_only=True)
     is_comment = serializers.BooleanField(read_only=True)
     can_be_deleted_by_user = serializers.BooleanField(read_only=True)
     is_liked_by_user = serializers.SerializerMethodField()
@@ -26,6 +38,7 @@ class PostSerializer(serializers.ModelSerializer):
             'views',
             'likes_count',
             'comments_count',
+            'replies_count',
             'avatar_color',
             'is_comment',
             'can_be_deleted_by_user',
@@ -34,10 +47,20 @@ class PostSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['uuid', 'timestamp', 'views', 'avatar_color']
     
+    def get_comments_count(self, obj):
+        """Comments on a post; always 0 for comments, whose replies are not counted"""
+        if obj.is_comment:
+            return 0
+        return obj.comments_count
+    
     def get_is_liked_by_user(self, obj):
         """Check if current user has liked this post"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            # Feed querysets annotate this to avoid one EXISTS per row
+            annotated = getattr(obj, 'is_liked_by_user', None)
+            if annotated is not None:
+                return annotated
             return Like.objects.filter(user=request.user, post=obj).exists()
         return False
     
@@ -45,7 +68,8 @@ class PostSerializer(serializers.ModelSerializer):
         """Check if current user owns this post (for deletion)"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.user == request.user
+            # Compare the raw FK so no user row is fetched
+            return obj.user_id == request.user.pk
         return False
     
     def validate_content(self, value):
@@ -64,27 +88,71 @@ class PostSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         validated_data['user'] = request.user
         validated_data['avatar_color'] = generate_random_color()
-        return super().create(validated_data)
+        
+        with transaction.atomic():
+            post = super().create(validated_data)
+            if post.parent_id is not None:
+                Post.objects.filter(pk=post.parent_id).update(
+                    comments_count=F('comments_count') + 1
+                )
+            invalidate_feed()
+        return post
+
+
+def comments_base_url(post, request=None):
+    """URL of the ?parent_uuid= feed listing post's comments"""
+    query = urlencode({
+        'parent_uuid': post.uuid,
+        'page_size': settings.COMMENTS_PAGE_SIZE,
+    })
+    url = f"{reverse('post-list')}?{query}"
+    if request is not None:
+        url = request.build_absolute_uri(url)
+    return url
 
 
 class PostDetailSerializer(PostSerializer):
-    """Detailed post serializer with comments"""
+    """Detailed post serializer with the first page of comments"""
     comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
     
     class Meta(PostSerializer.Meta):
-        fields = PostSerializer.Meta.fields + ['comments']
+        fields = PostSerializer.Meta.fields + ['comments', 'comments_next']
     
-    def get_comments(self, obj):
-        """Get all comments for this post"""
+    def _comments_page(self, obj):
+        """
+        Newest COMMENTS_PAGE_SIZE comments in one annotated query, plus a
+        cursor link into the ?parent_uuid= feed for the rest. Views that
+        already fetched the page pass it in context['comments_pages'][obj.pk].
+        """
         if obj.is_comment:
-            return []
-        
-        comments = Post.objects.filter(parent_uuid=obj.uuid).order_by('-timestamp')
+            return [], None
+        pages = self.context.setdefault('comments_pages', {})
+        if obj.pk not in pages:
+            request = self.context.get('request')
+            user = request.user if request else None
+            paginator = PostCursorPagination()
+            page = paginator.first_page(
+                Post.objects.visible().filter(parent=obj).with_feed_annotations(user),
+                settings.COMMENTS_PAGE_SIZE,
+            )
+            paginator.base_url = comments_base_url(obj, request)
+            pages[obj.pk] = (page, paginator.get_next_link())
+        return pages[obj.pk]
+    
+    def get_comments(self, obj):
+        """Get the first page of comments for this post"""
+        page, _ = self._comments_page(obj)
         return PostSerializer(
-            comments,
+            page,
             many=True,
             context=self.context
         ).data
+    
+    def get_comments_next(self, obj):
+        """Link to the next page of comments, or None"""
+        _, next_link = self._comments_page(obj)
+        return next_link
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -95,7 +163,7 @@ class LikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['timestamp']
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer for topics"""
     class Meta:
         model = Topic
@@ -0,0 +1,35 @@
+"""
+Signal handlers for posts
+"""
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_namespace, invalidate_feed
+from .models import FilteredWord, Post, Topic
+from .utils import invalidate_content_filter
+
+
+@receiver(post_save, sender=FilteredWord)
+@receiver(post_delete, sender=FilteredWord)
+def filtered_words_changed(sender, **kwargs):
+    """Rebuild the compiled content filter after FilteredWord changes"""
+    invalidate_content_filter()
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topics_changed(sender, **kwargs):
+    """Invalidate cached topic responses"""
+    bump_namespace('topics')
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleting(sender, instance, **kwargs):
+    """
+    A deleted user's likes cascade away without going through posts.likes,
+    so take them off likes_count first, in the same transaction
+    """
+    if Post.objects.filter(likes__user=instance).update(likes_count=F('likes_count') - 1):
+        invalidate_feed()
@@ -4,22 +4,77 @@ Celery tasks for scheduled operations
 from celery import shared_task
 from django.utils import timezone
 from django.conf import settings
-from datetime import timedelta
 import random
-from .models import Post, Topic
+from .models import Topic
+from .buffers import get_like_buffer, get_view_buffer
+from .expiry import expire_old_posts
+from .partitioning import is_partitioned, maintain_partitions, partitioning_enabled
 
 
 @shared_task
 def delete_old_posts():
     """
-    Delete posts older than 24 hours (auto-deletion)
+    Delete posts older than 24 hours (auto-deletion); with partitioned posts,
+    maintain the partitions first so expired intervals are dropped whole
     """
-    time_limit = timezone.now() - timedelta(hours=settings.POST_DELETION_HOURS)
-    old_posts = Post.objects.filter(timestamp__lte=time_limit)
-    count = old_posts.count()
-    old_posts.delete()
+    dropped, batches = expire_old_posts(batch_size=settings.POST_EXPIRY_BATCH_SIZE)
+    count = sum(batch['posts'] for batch in batches)
     
-    return f"Deleted {count} posts older than 24 hours"
+    if dropped:
+        return (
+            f"Dropped {len(dropped)} partitions, then deleted {count} posts "
+            f"older than 24 hours in {len(batches)} batches"
+        )
+    return f"Deleted {count} posts older than 24 hours in {len(batches)} batches"
+
+
+@shared_task
+def maintain_post_partitions():
+    """
+    Create upcoming posts partitions and drop expired ones (partitioned mode
+    only). Not scheduled: delete_old_posts runs this every hour before its
+    DELETEs, so the two never contend for the posts table's locks.
+    """
+    if not partitioning_enabled():
+        return "Post partitioning is disabled"
+    if not is_partitioned():
+        return "Posts are not partitioned yet; run manage.py partition_posts"
+    
+    created, dropped, orphaned = maintain_partitions()
+    
+    return (
+        f"Created {len(created)} partitions, dropped {len(dropped)}, "
+        f"deleted {orphaned} orphaned comments"
+    )
+
+
+@shared_task
+def flush_view_counts():
+    """
+    Flush buffered post view increments to the database in one UPDATE
+    """
+    if settings.VIEW_COUNT_BUFFER != 'redis':
+        return "In-memory view buffers are flushed by each web process"
+    
+    updated = get_view_buffer().flush()
+    
+    return f"Flushed buffered views for {updated} posts"
+
+
+@shared_task
+def flush_like_buffer():
+    """
+    Apply buffered likes/unlikes in bulk (write-behind mode only)
+    """
+    like_buffer = get_like_buffer()
+    if like_buffer is None:
+        return "Like buffering is disabled"
+    if settings.LIKE_BUFFER != 'redis':
+        return "In-memory like buffers are flushed by each web process"
+    
+    touched = like_buffer.flush()
+    
+    return f"Applied buffered likes for {touched} posts"
 
 
 @shared_task
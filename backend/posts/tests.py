@@ -0,0 +1,795 @@
+"""
+Tests for posts
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.throttling import AnonRateThrottle
+
+from moderation.models import Report
+
+from .buffers import (
+    InMemoryLikeBuffer, InMemoryViewBuffer, RedisLikeBuffer, RedisViewBuffer, apply_like_changes,
+)
+from .cache import FEED_NAMESPACE, namespace_version
+from .expiry import expire_old_posts, expire_posts
+from .likes import add_like, remove_like, toggle_like
+from . import async_views, utils
+from .models import BufferFlush, FilteredWord, Like, Post, Topic
+from .partitioning import convert_to_partitioned, is_partitioned, maintain_partitions
+from .tasks import delete_old_posts
+from .utils import ContentFilter
+from .views import LiveFeedThrottle
+
+User = get_user_model()
+
+# Tests must not share (or clear) the Redis cache other processes use
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class FeedQueryCountTests(TestCase):
+    """The feed costs the same number of queries whatever the page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='reader-password')
+        authors = [User.objects.create_user(username=f'author{index}') for index in range(3)]
+        topic = Topic.objects.create(date=timezone.now().date(), topic='Anything')
+        for index in range(30):
+            post = Post.objects.create(user=authors[index % 3], content=f'Post {index}', topic=topic)
+            Post.objects.create(user=authors[(index + 1) % 3], content='A comment', parent_uuid=post.uuid)
+            add_like(authors[index % 3].pk, post.pk)
+            if index % 2:
+                add_like(cls.reader.pk, post.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed_queries(self, page_size):
+        # Every request misses the feed cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/posts/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), page_size)
+        return len(context)
+
+    def test_anonymous_feed(self):
+        with self.assertNumQueries(1):
+            self.feed_queries(5)
+        with self.assertNumQueries(1):
+            self.feed_queries(25)
+
+    def test_authenticated_feed(self):
+        self.client.force_login(self.reader)
+        # Loads the session user into the user cache
+        self.feed_queries(5)
+        small = self.feed_queries(5)
+        large = self.feed_queries(25)
+        self.assertEqual(small, large)
+        with self.assertNumQueries(small):
+            self.feed_queries(25)
+
+    def test_like_flags(self):
+        self.client.force_login(self.reader)
+        results = self.client.get('/api/posts/', {'page_size': 30}).json()['results']
+        liked = {post['content'] for post in results if post['is_liked_by_user']}
+        self.assertEqual(liked, {f'Post {index}' for index in range(30) if index % 2})
+        self.assertTrue(all(post['likes_count'] >= 1 for post in results))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class FeedPaginationTests(TestCase):
+    """Keyset cursors over (timestamp, id)"""
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def create_post(self, content, minutes_ago):
+        post = Post.objects.create(content=content)
+        Post.objects.filter(pk=post.pk).update(timestamp=self.now - timedelta(minutes=minutes_ago))
+        return post
+
+    def page(self, url='/api/posts/', **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [post['content'] for post in data['results']], data
+
+    def test_next_cursor_is_stable_when_posts_are_inserted(self):
+        for index in range(5):
+            self.create_post(f'Post {index}', minutes_ago=index + 1)
+
+        first, data = self.page(page_size=2)
+        self.assertEqual(first, ['Post 0', 'Post 1'])
+
+        # Newer posts would shift an offset page; the cursor is anchored on Post 1
+        self.create_post('Newest', minutes_ago=0)
+        self.create_post('Also new', minutes_ago=0.5)
+        second, data = self.page(data['next'])
+        self.assertEqual(second, ['Post 2', 'Post 3'])
+        third, data = self.page(data['next'])
+        self.assertEqual(third, ['Post 4'])
+        self.assertIsNone(data['next'])
+
+    def test_timestamp_ties_are_ordered_by_id(self):
+        posts = [self.create_post(f'Post {index}', minutes_ago=1) for index in range(5)]
+        expected = [post.content for post in sorted(posts, key=lambda post: post.pk, reverse=True)]
+
+        seen, data = self.page(page_size=2)
+        pages = [seen]
+        while data['next']:
+            contents, data = self.page(data['next'])
+            pages.append(contents)
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(contents) for contents in pages], [2, 2, 1])
+
+        # Walking back from the last page returns the same rows
+        previous, data = self.page(data['previous'])
+        self.assertEqual(previous, pages[1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class CounterTests(TestCase):
+    """Denormalized likes_count and comments_count"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='author-password')
+        self.client.force_login(self.author)
+
+    def create(self, content, parent_uuid=None):
+        data = {'content': content}
+        if parent_uuid:
+            data['parent_uuid'] = str(parent_uuid)
+        response = self.client.post('/api/posts/', data)
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_comments_count_is_zero_for_comments(self):
+        post = self.create('A post')
+        comment = self.create('A comment', post['uuid'])
+        self.create('A reply', comment['uuid'])
+
+        detail = self.client.get(f"/api/posts/{Post.objects.get(uuid=post['uuid']).pk}/").json()
+        self.assertEqual(detail['comments_count'], 1)
+        self.assertEqual([c['comments_count'] for c in detail['comments']], [0])
+        comments = self.client.get('/api/posts/', {'parent_uuid': post['uuid']}).json()['results']
+        self.assertEqual([c['comments_count'] for c in comments], [0])
+
+    def test_replies_count_counts_replies_to_comments(self):
+        post = self.create('A post')
+        comment = self.create('A comment', post['uuid'])
+        self.create('A reply', comment['uuid'])
+        self.create('Another reply', comment['uuid'])
+
+        detail = self.client.get(f"/api/posts/{Post.objects.get(uuid=post['uuid']).pk}/").json()
+        self.assertEqual(detail['replies_count'], 1)
+        self.assertEqual([c['replies_count'] for c in detail['comments']], [2])
+        comments = self.client.get('/api/posts/', {'parent_uuid': post['uuid']}).json()['results']
+        self.assertEqual([c['replies_count'] for c in comments], [2])
+        replies = self.client.get('/api/posts/', {'parent_uuid': comment['uuid']}).json()['results']
+        self.assertEqual([c['replies_count'] for c in replies], [0, 0])
+
+    def test_deleting_a_user_takes_their_likes_off_likes_count(self):
+        post = Post.objects.create(user=self.author, content='A post')
+        fans = [User.objects.create_user(username=f'fan{index}') for index in range(3)]
+        for fan in fans:
+            add_like(fan.pk, post.pk)
+
+        fans[0].delete()
+        User.objects.filter(pk=fans[1].pk).delete()
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(post.likes_count, post.likes.count())
+        self.assertEqual(Post.objects.filter(pk=post.pk).reconcile_counters(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False, LIKE_BUFFER='')
+class FeedCacheTests(TestCase):
+    """Writes bump the feed cache namespace once they commit"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(user=self.author, content='A post')
+
+    def feed(self):
+        return {post['content']: post for post in self.client.get('/api/posts/').json()['results']}
+
+    def assert_write_refreshes_feed(self, write):
+        self.feed()
+        version = namespace_version(FEED_NAMESPACE)
+        with self.captureOnCommitCallbacks() as callbacks:
+            write()
+            # Still uncommitted: a reader re-caching now would keep the old version
+            self.assertEqual(namespace_version(FEED_NAMESPACE), version)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(namespace_version(FEED_NAMESPACE), version)
+        return self.feed()
+
+    def test_new_post_shows_up(self):
+        self.client.force_login(self.author)
+        feed = self.assert_write_refreshes_feed(
+            lambda: self.client.post('/api/posts/', {'content': 'A new post'})
+        )
+        self.assertIn('A new post', feed)
+
+    def test_new_comment_counts(self):
+        self.client.force_login(self.author)
+        feed = self.assert_write_refreshes_feed(
+            lambda: self.client.post('/api/posts/', {'content': 'A comment', 'parent_uuid': str(self.post.uuid)})
+        )
+        self.assertEqual(feed['A post']['comments_count'], 1)
+
+    def test_like_counts(self):
+        self.client.force_login(self.author)
+        feed = self.assert_write_refreshes_feed(
+            lambda: self.client.put(f'/api/posts/{self.post.pk}/like/')
+        )
+        self.assertEqual(feed['A post']['likes_count'], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class LiveFeedTests(TestCase):
+    """The live feed is only served by the ASGI app, and throttled"""
+
+    def test_not_routed_under_wsgi(self):
+        self.assertEqual(self.client.get('/api/posts/live/').status_code, 404)
+
+    @override_settings(ROOT_URLCONF='config.asgi_urls')
+    @mock.patch.object(LiveFeedThrottle, 'rate', '2/hour', create=True)
+    async def test_opening_streams_is_throttled(self):
+        for _ in range(2):
+            response = await self.async_client.get('/api/posts/live/', ACCEPT='text/event-stream')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response = await self.async_client.get('/api/posts/live/', ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class AsyncReadViewTests(TransactionTestCase):
+    """The ASGI app serves hot reads from async views with the DRF responses"""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Topic.objects.create(date=timezone.now().date(), topic='Anything')
+        self.post = Post.objects.create(user=author, content='A post')
+        for index in range(3):
+            Post.objects.create(user=author, content=f'Comment {index}', parent_uuid=self.post.uuid)
+        add_like(self.reader.pk, self.post.pk)
+
+    def bodies(self, urlconf):
+        """Responses to the read paths, uncached and then cached"""
+        paths = [
+            '/api/posts/',
+            f'/api/posts/?parent_uuid={self.post.uuid}&page_size=2',
+            f'/api/posts/{self.post.pk}/',
+            '/api/topics/today/',
+        ]
+        cache.clear()
+        bodies = []
+        with override_settings(ROOT_URLCONF=urlconf):
+            for _ in range(2):
+                for path in paths:
+                    response = self.client.get(path)
+                    self.assertEqual(response.status_code, 200, path)
+                    body = response.json()
+                    # Each detail read records a view
+                    body.pop('views', None)
+                    bodies.append(body)
+        return bodies
+
+    def test_responses_match_the_viewsets(self):
+        self.assertIs(resolve('/api/posts/', 'config.asgi_urls').func, async_views.post_list)
+        self.assertEqual(self.bodies('config.asgi_urls'), self.bodies('config.urls'))
+        self.client.force_login(self.reader)
+        async_bodies = self.bodies('config.asgi_urls')
+        self.assertTrue(async_bodies[0]['results'][0]['is_liked_by_user'])
+        self.assertEqual(async_bodies, self.bodies('config.urls'))
+
+    @override_settings(ROOT_URLCONF='config.asgi_urls')
+    @mock.patch.object(AnonRateThrottle, 'rate', '2/hour', create=True)
+    def test_default_throttles_apply(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+        response = self.client.get(f'/api/posts/{self.post.pk}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertTrue(response.json()['detail'].startswith('Request was throttled.'))
+
+    @override_settings(ROOT_URLCONF='config.asgi_urls')
+    def test_writes_go_to_the_viewset(self):
+        self.client.force_login(self.reader)
+        response = self.client.post('/api/posts/', {'content': 'Hello'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['content'], 'Hello')
+
+
+class CensorTests(SimpleTestCase):
+    """ContentFilter output matches the previous censor"""
+
+    def test_golden_corpus(self):
+        # Expected outputs were recorded from profanity.censor(text, '*')
+        # followed by one case-insensitive re.sub per filtered word
+        corpus = json.loads((Path(__file__).parent / 'testdata' / 'censor_corpus.json').read_text('utf-8'))
+        content_filter = ContentFilter(corpus['filtered_words'])
+        mismatches = [
+            (text, expected, content_filter.censor(text))
+            for text, expected in corpus['cases']
+            if content_filter.censor(text) != expected
+        ]
+        self.assertEqual(mismatches, [])
+
+    def per_word_censor(self, words, text):
+        """The previous FilteredWord step: one re.sub per word, in order"""
+        for word, replacement in words:
+            text = re.sub(re.escape(word), replacement, text, flags=re.IGNORECASE)
+        return text
+
+    def test_overlapping_words_keep_their_order(self):
+        words = [('ass', 'a**'), ('class', '[class]'), ('sses', '-')]
+        content_filter = ContentFilter(words)
+        for text in ('My Class', 'classes', 'bass class glasses', 'sass'):
+            self.assertEqual(content_filter.censor(text), self.per_word_censor(words, text))
+        self.assertEqual(content_filter.censor('My Class'), 'My Cla**')
+
+    def test_independent_words_in_one_pass(self):
+        words = [('darn', 'd**n'), ('heck', 'h**k'), ('spam', '****')]
+        content_filter = ContentFilter(words)
+        self.assertIsNone(content_filter.sequence)
+        for text in ('Darn it, HECK', 'spamspam heckdarn', 'nothing here'):
+            self.assertEqual(content_filter.censor(text), self.per_word_censor(words, text))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class RescreenPostsTests(TestCase):
+    """rescreen_posts censors every live post"""
+
+    def test_one_process_pool_for_all_batches(self):
+        posts = [Post.objects.create(content=f'post {index} says badword') for index in range(7)]
+        FilteredWord.objects.create(word='badword', replacement='[removed]')
+
+        with mock.patch.object(utils, 'ProcessPoolExecutor', wraps=utils.ProcessPoolExecutor) as pool:
+            call_command('rescreen_posts', chunk_size=2, processes=2, stdout=StringIO())
+
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(
+            [Post.objects.get(pk=post.pk).content for post in posts],
+            [f'post {index} says [removed]' for index in range(7)],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False, LIKE_BUFFER='', POST_DELETION_HOURS=24)
+class ExpiryTests(TestCase):
+    """delete_old_posts removes expired posts and their dependent rows in batches"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.fan = User.objects.create_user(username='fan')
+
+    def create_post(self, hours_ago, content='A post', parent=None):
+        post = Post.objects.create(content=content, parent_uuid=parent.uuid if parent else None)
+        Post.objects.filter(pk=post.pk).update(timestamp=self.now - timedelta(hours=hours_ago))
+        post.refresh_from_db()
+        return post
+
+    @override_settings(POST_EXPIRY_BATCH_SIZE=2)
+    def test_expires_in_batches_of_the_configured_size(self):
+        for _ in range(5):
+            self.create_post(hours_ago=30)
+        survivor = self.create_post(hours_ago=1)
+
+        with mock.patch('posts.expiry.expire_posts', wraps=expire_posts) as expire:
+            message = delete_old_posts()
+
+        self.assertEqual(expire.call_args.args[1], 2)
+        self.assertEqual(message, 'Deleted 5 posts older than 24 hours in 3 batches')
+        self.assertEqual(list(Post.objects.values_list('pk', flat=True)), [survivor.pk])
+
+    def test_only_rows_older_than_the_cutoff(self):
+        cutoff = self.now - timedelta(hours=24)
+        expired = self.create_post(hours_ago=24)
+        kept = self.create_post(hours_ago=23.9)
+
+        batches = expire_posts(cutoff, batch_size=10)
+
+        self.assertEqual([(batch['kind'], batch['posts']) for batch in batches], [('expired', 1)])
+        self.assertFalse(Post.objects.filter(pk=expired.pk).exists())
+        self.assertTrue(Post.objects.filter(pk=kept.pk).exists())
+
+    def test_dependent_likes_and_comments_go_too(self):
+        old = self.create_post(hours_ago=30)
+        fresh_reply = self.create_post(hours_ago=1, content='A reply', parent=old)
+        live = self.create_post(hours_ago=1)
+        old_comment = self.create_post(hours_ago=30, content='An old comment', parent=live)
+        Post.objects.filter(pk=live.pk).update(comments_count=1)
+        add_like(self.fan.pk, old.pk)
+        add_like(self.fan.pk, live.pk)
+
+        batches = expire_posts(self.now - timedelta(hours=24), batch_size=10)
+
+        self.assertEqual([batch['kind'] for batch in batches], ['expired', 'orphaned'])
+        self.assertEqual(batches[0]['cascaded'][Like._meta.db_table], 1)
+        remaining = set(Post.objects.values_list('pk', flat=True))
+        self.assertEqual(remaining, {live.pk})
+        self.assertNotIn(fresh_reply.pk, remaining)
+        self.assertNotIn(old_comment.pk, remaining)
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [live.pk])
+        live.refresh_from_db()
+        self.assertEqual(live.comments_count, 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+@override_settings(
+    CACHES=LOCMEM_CACHES, LIVE_FEED=False, LIKE_BUFFER='', POST_PARTITIONING=True,
+    POST_PARTITION_INTERVAL='hour', POST_PARTITIONS_AHEAD=2, POST_DELETION_HOURS=24,
+)
+class PartitioningTests(TestCase):
+    """Partitioned storage keeps the schema the models declare"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.old = self.post('Old', hours=-30)
+        self.comment = self.post('Late comment', hours=-2, parent_uuid=self.old.uuid)
+        self.live = self.post('Live', hours=-1)
+        add_like(self.bob.pk, self.old.pk)
+        add_like(self.bob.pk, self.comment.pk)
+        add_like(self.alice.pk, self.live.pk)
+        Report.objects.create(post=self.old, reporter=self.alice, reason='spam')
+        Report.objects.create(post=self.live, reporter=self.bob, reason='spam')
+
+    def post(self, content, hours, **fields):
+        post = Post.objects.create(content=content, **fields)
+        Post.objects.filter(pk=post.pk).update(timestamp=self.now + timedelta(hours=hours))
+        post.refresh_from_db()
+        return post
+
+    def check_constraints(self):
+        # Run the deferred foreign key checks, as committing would
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+    def constraints(self, table):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, table)
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+            return cursor.fetchone()[0]
+
+    def test_conversion_keeps_rows_and_constraints(self):
+        models = [Post, Like, Report]
+        before = {model: self.constraints(model._meta.db_table) for model in models}
+        rows = {model: model.objects.count() for model in models}
+        self.check_constraints()
+
+        self.assertTrue(convert_to_partitioned())
+
+        self.assertTrue(is_partitioned())
+        self.assertFalse(convert_to_partitioned())
+        for model in models:
+            table = model._meta.db_table
+            after = self.constraints(table)
+            # PostgreSQL adds a foreign key clone per referenced partition
+            self.assertLessEqual(set(before[model]), set(after), table)
+            self.assertEqual(model.objects.count(), rows[model], table)
+            unique = [
+                sorted(constraint['columns']) for constraint in after.values()
+                if constraint['unique'] and not constraint['primary_key']
+            ]
+            for fields in model._meta.unique_together + tuple(
+                constraint.fields for constraint in model._meta.constraints
+            ):
+                columns = sorted(model._meta.get_field(field).column for field in fields)
+                self.assertIn(columns, unique, table)
+        self.assertEqual(self.constraints('posts')['posts_pkey']['columns'], ['id', 'timestamp'])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_get_serial_sequence('posts', 'id')")
+            self.assertEqual(cursor.fetchone()[0], 'public.posts_id_seq')
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = 'likes'::regclass AND confrelid = 'posts'::regclass"
+            )
+            self.assertEqual(
+                [row[0] for row in cursor.fetchall()],
+                ['FOREIGN KEY (post_id, post_timestamp) REFERENCES posts(id, "timestamp") '
+                 'DEFERRABLE INITIALLY DEFERRED'],
+            )
+
+        newer = Post.objects.create(content='After conversion')
+        self.assertGreater(newer.pk, self.live.pk)
+        self.assertEqual(add_like(self.bob.pk, self.live.pk), (True, 2))
+        self.live.delete()
+        self.assertFalse(Like.objects.filter(post_id=self.live.pk).exists())
+        self.assertFalse(Report.objects.filter(post_id=self.live.pk).exists())
+
+    def test_maintenance_splits_default_and_drops_expired(self):
+        self.check_constraints()
+        convert_to_partitioned()
+        # Beyond the partitions created ahead, so it lands in DEFAULT
+        future = self.post('Scheduled', hours=5)
+        add_like(self.alice.pk, future.pk)
+        self.assertEqual(self.count('posts_default'), 1)
+        self.assertEqual(self.count('likes_default'), 1)
+        self.check_constraints()
+
+        created, dropped, orphaned = maintain_partitions(now=self.now + timedelta(hours=4))
+
+        self.assertIn(f"posts_p{(self.now + timedelta(hours=5)).strftime('%Y%m%d%H')}", created)
+        self.assertIn(f"likes_p{(self.now - timedelta(hours=30)).strftime('%Y%m%d%H')}", dropped)
+        self.assertEqual(orphaned, 1)
+        self.assertEqual(self.count('posts_default'), 0)
+        self.assertEqual(self.count('likes_default'), 0)
+        self.assertEqual(
+            sorted(Post.objects.values_list('content', flat=True)), ['Live', 'Scheduled']
+        )
+        self.assertEqual(
+            sorted(Like.objects.values_list('post_id', flat=True)), sorted([self.live.pk, future.pk])
+        )
+        self.assertEqual(list(Report.objects.values_list('post_id', flat=True)), [self.live.pk])
+
+        # The DEFAULT partitions got their foreign keys back
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Like.objects.bulk_create([
+                Like(user=self.bob, post_id=future.pk, post_timestamp=self.now + timedelta(days=30))
+            ])
+
+    def test_expiry_drops_partitions_before_deleting_rows(self):
+        # Half past the hour, so the cutoff partition holds rows on both sides of the cutoff
+        now = self.now.replace(minute=30, second=0, microsecond=0)
+        cutoff = now - timedelta(hours=24)
+        past_cutoff = self.post('Past the cutoff', hours=0)
+        Post.objects.filter(pk=past_cutoff.pk).update(timestamp=cutoff - timedelta(minutes=10))
+        before_cutoff = self.post('Before the cutoff', hours=0)
+        Post.objects.filter(pk=before_cutoff.pk).update(timestamp=cutoff + timedelta(minutes=10))
+        self.check_constraints()
+        convert_to_partitioned()
+
+        dropped, batches = expire_old_posts(batch_size=10, now=now)
+
+        self.assertIn(f"posts_p{self.old.timestamp.strftime('%Y%m%d%H')}", dropped)
+        # The dropped posts never reach the DELETEs; their orphaned comment does
+        self.assertEqual(
+            [(batch['kind'], batch['posts']) for batch in batches], [('expired', 1), ('orphaned', 1)]
+        )
+        self.assertEqual(
+            sorted(Post.objects.values_list('content', flat=True)), ['Before the cutoff', 'Live']
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class LikeBufferTests(TestCase):
+    """Buffered likes reach the database as net changes"""
+
+    def setUp(self):
+        self.post = Post.objects.create(content='Viral')
+        self.fans = [User.objects.create_user(username=f'fan{index}') for index in range(3)]
+        Like.objects.create(user=self.fans[2], post=self.post)
+        # A drifted count shows that flushes add to it rather than recount
+        Post.objects.filter(pk=self.post.pk).update(likes_count=10)
+
+    def test_flush_applies_net_changes_once(self):
+        changes = {
+            (self.fans[0].pk, self.post.pk): True,
+            (self.fans[1].pk, self.post.pk): True,
+            (self.fans[2].pk, self.post.pk): False,
+        }
+        self.assertEqual(apply_like_changes(changes), 1)
+        self.assertEqual(apply_like_changes(changes), 0)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 11)
+        self.assertEqual(
+            set(self.post.likes.values_list('user_id', flat=True)), {self.fans[0].pk, self.fans[1].pk}
+        )
+
+    def test_memory_buffer_never_flushes_while_recording(self):
+        buffer = InMemoryLikeBuffer(flush_seconds=3600)
+        with mock.patch('posts.buffers.apply_like_changes', side_effect=DatabaseError):
+            buffer.record(self.fans[0].pk, self.post.pk, True)
+            buffer.record(self.fans[2].pk, self.post.pk, False)
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        self.assertEqual(buffer.pending(self.fans[0].pk, [self.post.pk]), {self.post.pk: True})
+
+        # One like in, one out: no net change to the count
+        self.assertEqual(buffer.flush(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 10)
+        self.assertEqual(list(self.post.likes.values_list('user_id', flat=True)), [self.fans[0].pk])
+        self.assertEqual(buffer.pending(self.fans[0].pk, [self.post.pk]), {})
+
+
+def run_threads(target, count):
+    """Run target(index) on count threads at once; each closes its connections"""
+    def run(index):
+        try:
+            target(index)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False, LIKE_BUFFER='')
+class ConcurrentLikeTests(TransactionTestCase):
+    """Concurrent likes and unlikes keep likes_count equal to the like rows"""
+
+    def test_likes_count_matches_rows(self):
+        post = Post.objects.create(content='Popular')
+        # Two threads per user, so the same (user, post) pair races too
+        users = [User.objects.create_user(username=f'fan{index}') for index in range(6)]
+        errors = []
+
+        def hammer(index):
+            user_id = users[index % len(users)].pk
+            actions = [add_like, remove_like, toggle_like, add_like, toggle_like]
+            try:
+                for step in range(40):
+                    _, likes_count = actions[(index + step) % len(actions)](user_id, post.pk)
+                    if likes_count < 0:
+                        errors.append(likes_count)
+            except Exception as error:
+                errors.append(error)
+
+        run_threads(hammer, len(users) * 2)
+
+        self.assertEqual(errors, [])
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, Like.objects.filter(post=post).count())
+        self.assertEqual(Post.objects.filter(pk=post.pk).reconcile_counters(), 0)
+
+
+class RedisViewBufferTests(TransactionTestCase):
+    """Buffered views reach the database exactly once"""
+
+    def setUp(self):
+        self.post = Post.objects.create(content='Viewed')
+        self.buffer = RedisViewBuffer(settings.REDIS_URL, f'test:views:{uuid.uuid4().hex}')
+        self.addCleanup(self.delete_keys)
+
+    def delete_keys(self):
+        keys = self.buffer.client.keys(f'{self.buffer.key}*')
+        if keys:
+            self.buffer.client.delete(*keys)
+
+    def test_concurrent_views_and_flushes_lose_nothing(self):
+        readers, views_each = 8, 200
+        done = threading.Event()
+
+        def flush_until_done():
+            try:
+                while not done.is_set():
+                    self.buffer.flush()
+            finally:
+                connections.close_all()
+
+        flushers = [threading.Thread(target=flush_until_done) for _ in range(2)]
+        for flusher in flushers:
+            flusher.start()
+        run_threads(lambda index: [self.buffer.record(self.post.pk) for _ in range(views_each)], readers)
+        done.set()
+        for flusher in flushers:
+            flusher.join()
+        self.buffer.flush()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, readers * views_each)
+        self.assertEqual(self.buffer.client.keys(f'{self.buffer.key}*'), [])
+
+    def test_claim_is_not_reapplied_when_cleanup_fails(self):
+        for _ in range(5):
+            self.buffer.record(self.post.pk)
+        with mock.patch.object(self.buffer.client, 'pipeline', side_effect=redis.ConnectionError):
+            with self.assertRaises(redis.ConnectionError):
+                self.buffer.flush()
+        self.assertEqual(BufferFlush.objects.count(), 1)
+
+        self.assertEqual(self.buffer.record(self.post.pk), 1)
+        self.buffer.flush()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 6)
+        self.assertEqual(self.buffer.client.keys(f'{self.buffer.key}*'), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_FEED=False)
+class RedisLikeBufferTests(TransactionTestCase):
+    """Buffered like batches are claimed atomically and applied once, in order"""
+
+    def setUp(self):
+        self.post = Post.objects.create(content='Viral')
+        self.fans = [User.objects.create_user(username=f'fan{index}') for index in range(2)]
+        self.buffer = RedisLikeBuffer(settings.REDIS_URL, f'test:likes:{uuid.uuid4().hex}')
+        self.addCleanup(self.delete_keys)
+
+    def delete_keys(self):
+        keys = self.buffer.client.keys(f'{self.buffer.key}*')
+        if keys:
+            self.buffer.client.delete(*keys)
+
+    def test_overlapping_flush_loses_nothing(self):
+        self.buffer.record(self.fans[0].pk, self.post.pk, True)
+        overlapped = []
+
+        def apply_with_overlap(changes):
+            if not overlapped:
+                # A second flush starts while the first batch is being applied
+                overlapped.append(True)
+                self.buffer.record(self.fans[1].pk, self.post.pk, True)
+                self.buffer.record(self.fans[0].pk, self.post.pk, False)
+                self.buffer.flush()
+            return apply_like_changes(changes)
+
+        with mock.patch('posts.buffers.apply_like_changes', side_effect=apply_with_overlap):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(set(Like.objects.values_list('user_id', flat=True)), {self.fans[0].pk})
+
+        # The states recorded during the first flush are the next batch; one
+        # like and one unlike leave likes_count unchanged
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(set(Like.objects.values_list('user_id', flat=True)), {self.fans[1].pk})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.client.keys(f'{self.buffer.key}*'), [])
+
+
+class InMemoryViewBufferTests(TransactionTestCase):
+    """Per-process view buffer"""
+
+    def setUp(self):
+        self.post = Post.objects.create(content='Viewed')
+
+    def test_recording_never_flushes(self):
+        buffer = InMemoryViewBuffer(flush_seconds=3600)
+        with mock.patch('posts.buffers.apply_view_increments', side_effect=DatabaseError):
+            self.assertEqual([buffer.record(self.post.pk) for _ in range(3)], [1, 2, 3])
+
+    def test_background_flush(self):
+        buffer = InMemoryViewBuffer(flush_seconds=0.05)
+        buffer.record(self.post.pk)
+        buffer.record(self.post.pk)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            self.post.refresh_from_db()
+            if self.post.views == 2:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.post.views, 2)
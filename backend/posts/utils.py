@@ -3,12 +3,28 @@ Utility functions for content filtering and validation
 """
 import re
 import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from better_profanity import profanity
+from better_profanity.constants import ALLOWED_CHARACTERS
+from django.conf import settings
 from .models import FilteredWord
 
-# Initialize profanity filter
+# Load the better-profanity wordlist (merged into ContentFilter below)
 profanity.load_censor_words()
 
+# Prohibited content patterns, compiled once per process
+URL_PATTERN = re.compile(
+    r'(https?://|www\.)\S+|[a-zA-Z0-9-]+\.(com|net|org|edu|gov|io|co|app|dev)\S*',
+    re.IGNORECASE
+)
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}|\d{10,}')
+HANDLE_PATTERN = re.compile(r'@[A-Za-z0-9_]+')
+
 
 def generate_random_color():
     """Generate a random hex color for avatar"""
@@ -20,19 +36,262 @@ def generate_random_color():
     return random.choice(colors)
 
 
-def mask_profanity(text):
-    """Mask profanity in text"""
-    # Use better-profanity for basic filtering
-    censored = profanity.censor(text, '*')
+def _character_class(chars):
+    """Regex character class for chars, with consecutive code points as ranges"""
+    ranges = []
+    for code in sorted(map(ord, chars)):
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return '[' + ''.join(
+        re.escape(chr(first)) if first == last else f'{re.escape(chr(first))}-{re.escape(chr(last))}'
+        for first, last in ranges
+    ) + ']'
+
+
+# better-profanity's words are runs of these characters (letters, digits,
+# @$*"' and combining marks); everything else separates words
+PROFANITY_WORD_PATTERN = re.compile(_character_class(ALLOWED_CHARACTERS) + '+')
+# Most following words better-profanity joins to a word ("s h i t")
+PROFANITY_MAX_JOINED_WORDS = profanity.MAX_NUMBER_COMBINATIONS
+PROFANITY_CENSOR = '****'
+
+
+def build_trie_pattern(words, char_pattern=re.escape, prefixes=False):
+    """
+    Build a regex alternation from a prefix trie of words, so shared
+    prefixes are matched once instead of once per word. Longer words win
+    over their own prefixes because each optional tail is greedy.
+    
+    char_pattern renders a single character. With prefixes, the pattern
+    also matches every prefix of every word.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def build(node):
+        is_end = prefixes or '' in node
+        branches = [
+            char_pattern(char) + build(child)
+            for char, child in sorted(node.items())
+            if char != ''
+        ]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if is_end else pattern
+    
+    return build(trie)
+
+
+def _profanity_char_pattern(char):
+    """Match a character or any of its better-profanity look-alikes (a -> @, 4, ...)"""
+    variants = profanity.CHARS_MAPPING.get(char)
+    if not variants:
+        return re.escape(char)
+    return '[' + ''.join(re.escape(variant) for variant in variants) + ']'
+
+
+# Lowercased candidate -> is it a wordlist entry, look-alikes included
+# (what better-profanity's `candidate in CENSOR_WORDSET` computes)
+PROFANITY_ENTRIES = sorted({str(word) for word in profanity.CENSOR_WORDSET})
+PROFANITY_PATTERN = re.compile(
+    build_trie_pattern(PROFANITY_ENTRIES, char_pattern=_profanity_char_pattern)
+)
+# Same for the start of an entry, to stop joining words early
+PROFANITY_PREFIX_PATTERN = re.compile(
+    build_trie_pattern(PROFANITY_ENTRIES, char_pattern=_profanity_char_pattern, prefixes=True)
+)
+
+
+def censor_profanity(text):
+    """
+    Censor the better-profanity wordlist in text with the same output as
+    profanity.censor(text), from a single tokenization of the text.
+    
+    Like better-profanity, each word followed by a separator is first
+    joined with up to PROFANITY_MAX_JOINED_WORDS following words, with and
+    without the separators between them ("fu ck", "f-u-c-k"), and the
+    shortest joined match is censored whole; otherwise the word alone is
+    checked. The last word of the text is only checked alone, and a
+    one-character last word is never joined to the words before it.
+    """
+    length = len(text)
+    words = [match.span() for match in PROFANITY_WORD_PATTERN.finditer(text)]
+    if not words or words[0][0] >= length - 1:
+        return text
+    joinable = len(words) if words[-1][0] < length - 1 else len(words) - 1
+    
+    parts = []
+    position = 0
+    index = 0
+    while index < len(words):
+        start, end = words[index]
+        word = text[start:end].lower()
+        # Every candidate starts with the word, so most words stop here
+        if not PROFANITY_PREFIX_PATTERN.fullmatch(word):
+            index += 1
+            continue
+        matched = None
+        if end < length:
+            joined = separated = word
+            for next_index in range(index + 1, min(index + 1 + PROFANITY_MAX_JOINED_WORDS, joinable)):
+                next_start, next_end = words[next_index]
+                joined += text[next_start:next_end].lower()
+                separated += text[words[next_index - 1][1]:next_end].lower()
+                joined_prefix = PROFANITY_PREFIX_PATTERN.fullmatch(joined)
+                separated_prefix = PROFANITY_PREFIX_PATTERN.fullmatch(separated)
+                if not (joined_prefix or separated_prefix):
+                    break
+                if (
+                    (joined_prefix and PROFANITY_PATTERN.fullmatch(joined))
+                    or (separated_prefix and PROFANITY_PATTERN.fullmatch(separated))
+                ):
+                    matched = next_index
+                    break
+        if matched is not None:
+            parts.append(text[position:start])
+            parts.append(PROFANITY_CENSOR)
+            position = words[matched][1]
+            index = matched + 1
+            continue
+        if PROFANITY_PATTERN.fullmatch(word):
+            parts.append(text[position:start])
+            parts.append(PROFANITY_CENSOR)
+            position = end
+        index += 1
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def _overlap(first, second):
+    """Whether an occurrence of first can share characters with one of second"""
+    if first in second or second in first:
+        return True
+    shortest = min(len(first), len(second))
+    return any(
+        first[-size:] == second[:size] or second[-size:] == first[:size]
+        for size in range(1, shortest)
+    )
+
+
+def _replaces_independently(words):
+    """
+    Whether one pass over an alternation of words gives the same text as
+    one re.sub per word in turn: no two words can overlap, and no word can
+    overlap a replacement (which could create or split a later match)
+    """
+    lowered = [(word.lower(), replacement.lower()) for word, replacement in words]
+    for index, (word, _) in enumerate(lowered):
+        if any(_overlap(word, other) for other, _ in lowered[index + 1:]):
+            return False
+        if any(_overlap(word, replacement) for _, replacement in lowered):
+            return False
+    return True
+
+
+class ContentFilter:
+    """
+    Censor for the built-in profanity wordlist and the active FilteredWord
+    list.
+    
+    Built-in words are matched by censor_profanity against one precompiled
+    regex and become '****'. FilteredWord entries then replace their
+    case-insensitive matches, in FilteredWord order, over the censored text.
+    When no entry can overlap another entry or a replacement, the order
+    cannot matter and the entries are merged into one regex that uses each
+    entry's own replacement; otherwise (e.g. 'ass' and 'class', where
+    'class' becomes 'cla**') each entry is applied in turn, and only to
+    text in which one of them occurs.
+    """
+    
+    def __init__(self, words):
+        """words: iterable of (word, replacement) pairs, in FilteredWord order"""
+        words = [(word, replacement) for word, replacement in words if word]
+        self.replacements = {}
+        for word, replacement in words:
+            self.replacements.setdefault(word.lower(), replacement)
+        
+        self.pattern = None
+        self.sequence = None
+        if words:
+            self.pattern = re.compile(build_trie_pattern(self.replacements), re.IGNORECASE)
+            if not _replaces_independently(words):
+                self.sequence = [
+                    (re.compile(re.escape(word), re.IGNORECASE), replacement)
+                    for word, replacement in words
+                ]
+    
+    def _replace(self, match):
+        text = match.group(0)
+        return self.replacements.get(text.lower(), text)
+    
+    def censor(self, text):
+        """Replace every profane and filtered word in text"""
+        text = censor_profanity(text)
+        if self.pattern is None:
+            return text
+        if self.sequence is None:
+            return self.pattern.sub(self._replace, text)
+        # Nothing is replaced unless some entry occurs in the text itself
+        if not self.pattern.search(text):
+            return text
+        for pattern, replacement in self.sequence:
+            text = pattern.sub(replacement, text)
+        return text
+
+
+_content_filter = None
+_content_filter_built_at = 0.0
+_content_filter_lock = threading.Lock()
+
+
+def _content_filter_is_fresh():
+    return (
+        _content_filter is not None
+        and time.monotonic() - _content_filter_built_at < settings.CONTENT_FILTER_TTL_SECONDS
+    )
+
+
+def get_content_filter():
+    """
+    Return the per-process ContentFilter, rebuilding it when it has been
+    invalidated or is older than CONTENT_FILTER_TTL_SECONDS (which bounds
+    staleness for changes made in other processes)
+    """
+    global _content_filter, _content_filter_built_at
     
-    # Apply custom filtered words from database
-    filtered_words = FilteredWord.objects.filter(is_active=True)
-    for fw in filtered_words:
-        # Case-insensitive replacement
-        pattern = re.compile(re.escape(fw.word), re.IGNORECASE)
-        censored = pattern.sub(fw.replacement, censored)
+    content_filter = _content_filter
+    if _content_filter_is_fresh():
+        return content_filter
     
-    return censored
+    with _content_filter_lock:
+        if not _content_filter_is_fresh():
+            words = FilteredWord.objects.filter(is_active=True).values_list(
+                'word', 'replacement'
+            )
+            _content_filter = ContentFilter(words)
+            _content_filter_built_at = time.monotonic()
+        return _content_filter
+
+
+def invalidate_content_filter():
+    """Drop the cached ContentFilter so the next call rebuilds it"""
+    global _content_filter
+    with _content_filter_lock:
+        _content_filter = None
+
+
+def mask_profanity(text):
+    """Mask profanity and custom filtered words in text"""
+    return get_content_filter().censor(text)
 
 
 def detect_prohibited_content(text):
@@ -43,29 +302,25 @@ def detect_prohibited_content(text):
     violations = []
     
     # URL pattern
-    url_pattern = r'(https?://|www\.)\S+|[a-zA-Z0-9-]+\.(com|net|org|edu|gov|io|co|app|dev)\S*'
-    if re.search(url_pattern, text, re.IGNORECASE):
+    if URL_PATTERN.search(text):
         violations.append('URL/link')
     
     # Email pattern
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    if re.search(email_pattern, text):
+    if EMAIL_PATTERN.search(text):
         violations.append('email address')
     
     # Phone number pattern (various formats)
-    phone_pattern = r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}|\d{10,}'
-    if re.search(phone_pattern, text):
+    if PHONE_PATTERN.search(text):
         violations.append('phone number')
     
     # Social media handles
-    handle_pattern = r'@[A-Za-z0-9_]+'
-    if re.search(handle_pattern, text):
+    if HANDLE_PATTERN.search(text):
         violations.append('social media handle')
     
     return violations
 
 
-def filter_content(text):
+def filter_content(text, content_filter=None):
     """
     Main content filtering function
     Returns: (filtered_text, violations_list)
@@ -77,12 +332,13 @@ def filter_content(text):
         return text, violations
     
     # Apply profanity filtering
-    filtered_text = mask_profanity(text)
+    content_filter = content_filter or get_content_filter()
+    filtered_text = content_filter.censor(text)
     
     return filtered_text, []
 
 
-def validate_post_content(content):
+def validate_post_content(content, content_filter=None):
     """
     Validate post content
     Returns: (is_valid, filtered_content, error_message)
@@ -93,9 +349,76 @@ def validate_post_content(content):
     if len(content) > 5000:
         return False, content, "Content exceeds maximum length of 5000 characters"
     
-    filtered, violations = filter_content(content)
+    filtered, violations = filter_content(content, content_filter)
     
     if violations:
         return False, content, f"Content contains prohibited items: {', '.join(violations)}"
     
     return True, filtered, None
+
+
+# Filter used by process pool workers, built once per worker
+_worker_filter = None
+
+
+def _init_batch_worker(words):
+    global _worker_filter
+    _worker_filter = ContentFilter(words)
+
+
+def _run_batch_chunk(func, texts):
+    return [func(text, _worker_filter) for text in texts]
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_batch(func, texts, processes=None, chunk_size=500):
+    """
+    Apply func(text, content_filter) to every text and yield results in
+    input order. Every call shares one compiled ContentFilter; with
+    processes > 1, chunks are fanned out to a process pool and at most two
+    chunks per worker are in flight, so arbitrarily long inputs stream.
+    """
+    content_filter = get_content_filter()
+    
+    if not processes or processes <= 1:
+        for text in texts:
+            yield func(text, content_filter)
+        return
+    
+    words = list(content_filter.replacements.items())
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_batch_worker,
+        initargs=(words,),
+    ) as pool:
+        pending = deque()
+        for chunk in _chunked(texts, chunk_size):
+            pending.append(pool.submit(_run_batch_chunk, func, chunk))
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def filter_content_batch(texts, processes=None, chunk_size=500):
+    """
+    Batch version of filter_content
+    Yields: (filtered_text, violations_list) per text, in order
+    """
+    return _run_batch(filter_content, texts, processes, chunk_size)
+
+
+def validate_post_content_batch(contents, processes=None, chunk_size=500):
+    """
+    Batch version of validate_post_content
+    Yields: (is_valid, filtered_content, error_message) per content, in order
+    """
+    return _run_batch(validate_post_content, contents, processes, chunk_size)
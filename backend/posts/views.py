@@ -4,27 +4,54 @@ Views for posts, comments, likes, and topics
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.throttling import SimpleRateThrottle, UserRateThrottle
+from rest_framework.views import APIView
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db.models import Count, Q, F
 from django.db import models
 from datetime import timedelta
 
-from .models import Post, Like, Topic
+from .models import Post, Topic
+from .buffers import get_like_buffer, get_view_buffer
+from .live import event_stream, publish_event
+from .likes import add_like, remove_like, toggle_like
+from .cache import namespaced_key
+from .feed import apply_user_flags, feed_cache_key, feed_queryset, shared_payload
 from .serializers import PostSerializer, PostDetailSerializer, TopicSerializer
+from .pagination import PostCursorPagination
 from .permissions import IsOwnerOrReadOnly
 
 
 class PostCreateThrottle(UserRateThrottle):
-    """Throttle for post creation"""
-    rate = '10/hour'
+    """Throttle for post creation (rate from DEFAULT_THROTTLE_RATES)"""
+    scope = 'post_create'
 
 
 class LikeThrottle(UserRateThrottle):
-    """Throttle for likes"""
-    rate = '100/hour'
+    """Throttle for likes (rate from DEFAULT_THROTTLE_RATES)"""
+    scope = 'like'
+
+
+class LiveFeedThrottle(SimpleRateThrottle):
+    """
+    Throttle for opening the live feed, per user or per IP address (rate
+    from DEFAULT_THROTTLE_RATES); bounds reconnect storms
+    """
+    scope = 'live'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
 
 
 class PostViewSet(viewsets.ModelViewSet):
@@ -32,24 +59,15 @@ class PostViewSet(viewsets.ModelViewSet):
     ViewSet for posts and comments
     """
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = PostCursorPagination
     
     def get_queryset(self):
         """
         Get posts, optionally filtered by parent_uuid for comments
         """
-        queryset = Post.objects.all().select_related('topic').annotate(
-            likes_count=Count('likes')
+        return feed_queryset(
+            self.request.user, self.request.query_params.get('parent_uuid', None)
         )
-        
-        # Filter by parent_uuid to get comments for a specific post
-        parent_uuid = self.request.query_params.get('parent_uuid', None)
-        if parent_uuid:
-            queryset = queryset.filter(parent_uuid=parent_uuid)
-        else:
-            # By default, only return top-level posts (not comments)
-            queryset = queryset.filter(parent_uuid__isnull=True)
-        
-        return queryset
     
     def get_serializer_class(self):
         """Use detailed serializer for retrieve action"""
@@ -63,18 +81,67 @@ class PostViewSet(viewsets.ModelViewSet):
             return [PostCreateThrottle()]
         return super().get_throttles()
     
+    def _cached_response(self, data):
+        """Serve a shared cached body, with the caller's own flags merged in"""
+        if self.request.user.is_authenticated:
+            data = apply_user_flags(data, self.request.user)
+        return Response(data)
+    
+    def list(self, request, *args, **kwargs):
+        """
+        List posts; pages are shared between users and cached until the
+        next write bumps the feed version
+        """
+        cache_key = feed_cache_key(request, self.action)
+        data = cache.get(cache_key)
+        if data is not None:
+            return self._cached_response(data)
+        
+        response = super().list(request, *args, **kwargs)
+        cache.set(cache_key, shared_payload(response.data), settings.FEED_CACHE_SECONDS)
+        if request.user.is_authenticated and get_like_buffer() is not None:
+            apply_user_flags(response.data, request.user)
+        return response
+    
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieve a single post and increment view count
         """
+        cache_key = feed_cache_key(request, self.action)
+        data = cache.get(cache_key)
+        view_buffer = get_view_buffer()
+        
+        if data is not None:
+            # Buffer the view; the cached body shows views as of caching
+            view_buffer.record(int(self.kwargs[self.lookup_field]))
+            return self._cached_response(data)
+        
         instance = self.get_object()
         
-        # Increment view count
-        instance.views += 1
-        instance.save(update_fields=['views'])
+        # Buffer the view; it reaches Post.views on the next batched flush
+        instance.views += view_buffer.record(instance.pk)
         
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        data = serializer.data
+        cache.set(cache_key, shared_payload(data), settings.FEED_CACHE_SECONDS)
+        if request.user.is_authenticated and get_like_buffer() is not None:
+            apply_user_flags(data, request.user)
+        return Response(data)
+    
+    def perform_create(self, serializer):
+        """Save the post and announce it on the live feed"""
+        post = serializer.save()
+        if not settings.LIVE_FEED:
+            return
+        if post.parent_id is None:
+            publish_event('post', shared_payload(serializer.data))
+            return
+        # Only top-level posts show a comment count
+        comments_count = Post.objects.filter(
+            pk=post.parent_id, parent_uuid__isnull=True
+        ).values_list('comments_count', flat=True).first()
+        if comments_count is not None:
+            publish_event('comments', {'uuid': post.parent_uuid, 'comments_count': comments_count})
     
     def destroy(self, request, *args, **kwargs):
         """
@@ -99,45 +166,84 @@ class PostViewSet(viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], throttle_classes=[LikeThrottle])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticated], throttle_classes=[LikeThrottle])
     def like(self, request, pk=None):
         """
-        Like or unlike a post
+        Like (PUT), unlike (DELETE) or toggle (POST) a post.
+        PUT and DELETE are idempotent; repeating them leaves the count alone.
         """
         post = self.get_object()
-        user = request.user
         
-        # Check if user already liked this post
-        like = Like.objects.filter(user=user, post=post).first()
+        if request.method == 'PUT':
+            created, likes_count = add_like(request.user.pk, post.pk)
+            return Response(
+                {'message': 'Post liked', 'likes_count': likes_count},
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
         
-        if like:
-            # Unlike
-            like.delete()
+        if request.method == 'DELETE':
+            _, likes_count = remove_like(request.user.pk, post.pk)
             return Response(
-                {'message': 'Post unliked', 'likes_count': post.likes_count},
+                {'message': 'Post unliked', 'likes_count': likes_count},
                 status=status.HTTP_200_OK
             )
-        else:
-            # Like
-            Like.objects.create(user=user, post=post)
+        
+        liked, likes_count = toggle_like(request.user.pk, post.pk)
+        if liked:
             return Response(
-                {'message': 'Post liked', 'likes_count': post.likes_count},
+                {'message': 'Post liked', 'likes_count': likes_count},
                 status=status.HTTP_201_CREATED
             )
+        return Response(
+            {'message': 'Post unliked', 'likes_count': likes_count},
+            status=status.HTTP_200_OK
+        )
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_posts(self, request):
         """
         Get all posts created by current user
         """
-        posts = Post.objects.filter(user=request.user).annotate(
-            likes_count=Count('likes')
+        posts = Post.objects.filter(user=request.user).with_feed_annotations(
+            request.user
         ).order_by('-timestamp')
         
         serializer = self.get_serializer(posts, many=True)
         return Response(serializer.data)
 
 
+class EventStreamNegotiation(BaseContentNegotiation):
+    """
+    Always pick the first renderer: EventSource asks for text/event-stream,
+    which only the streamed body is, so errors are still rendered as JSON
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class LiveFeedView(APIView):
+    """
+    Server-sent events for new top-level posts, comment counts and like
+    counts. Only routed in config/asgi_urls.py: the view returns at once and
+    the ASGI server streams the events on its event loop, so each idle
+    client is a queue rather than a worker thread.
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = [LiveFeedThrottle]
+    renderer_classes = [JSONRenderer]
+    content_negotiation_class = EventStreamNegotiation
+
+    def get(self, request):
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class TopicViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for topics (read-only for users)
@@ -150,11 +256,17 @@ class TopicViewSet(viewsets.ReadOnlyModelViewSet):
     def today(self, request):
         """Get today's topic"""
         today = timezone.now().date()
-        topic = Topic.objects.filter(date=today).first()
+        cache_key = namespaced_key('topics', 'today', today.isoformat())
+        data = cache.get(cache_key)
+        
+        if data is None:
+            topic = Topic.objects.filter(date=today).first()
+            # An empty dict records "no topic" so misses are cached too
+            data = dict(self.get_serializer(topic).data) if topic else {}
+            cache.set(cache_key, data, settings.TOPIC_CACHE_SECONDS)
         
-        if topic:
-            serializer = self.get_serializer(topic)
-            return Response(serializer.data)
+        if data:
+            return Response(data)
         
         return Response(
             {'message': 'No topic for today'},
@@ -0,0 +1,75 @@
+"""
+Authentication backend that caches the session user
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import router, transaction
+
+UserModel = get_user_model()
+
+# Never cached; the session auth hash derived from it is cached instead
+UNCACHED_FIELDS = {'password'}
+
+
+def user_cache_key(user_id):
+    return f'users:fields:{user_id}'
+
+
+def forget_cached_users(user_ids):
+    """Drop the cached session users once the current transaction commits"""
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user (run for every authenticated request) is
+    served from the cache for USER_CACHE_SECONDS. The cache holds the user's
+    field values and session auth hash, never the password hash; the user
+    is rebuilt with the password deferred. Saving, deleting or updating
+    users through the ORM drops the entry (users/signals.py, UserQuerySet);
+    raw SQL does not.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None and (
+            username is not None or kwargs.get(UserModel.USERNAME_FIELD) is not None
+        ):
+            # The password was checked: stop ModelBackend, which stays in
+            # AUTHENTICATION_BACKENDS for older sessions, from hashing it again
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        if not settings.USER_CACHE_SECONDS:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        cached = cache.get(key)
+        if cached is not None:
+            return self._from_cache(cached)
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(key, self._to_cache(user), settings.USER_CACHE_SECONDS)
+        return user
+
+    def _to_cache(self, user):
+        return {
+            'fields': {
+                field.attname: getattr(user, field.attname)
+                for field in UserModel._meta.concrete_fields
+                if field.name not in UNCACHED_FIELDS
+            },
+            'session_auth_hash': user.get_session_auth_hash(),
+        }
+
+    def _from_cache(self, cached):
+        fields = cached['fields']
+        names = [field.attname for field in UserModel._meta.concrete_fields if field.attname in fields]
+        user = UserModel.from_db(router.db_for_read(UserModel), names, [fields[name] for name in names])
+        user.cached_session_auth_hash = cached['session_auth_hash']
+        return user
@@ -1,10 +1,30 @@
 """
 User model for authentication (identity never exposed publicly)
 """
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.db import models
 
 
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Update users and drop them from the session user cache"""
+        from .backends import forget_cached_users
+        
+        forget_cached_users(list(self.values_list('pk', flat=True)))
+        return super().update(**kwargs)
+    
+    def bulk_update(self, objs, fields, batch_size=None):
+        """bulk_update that drops the users from the session user cache"""
+        from .backends import forget_cached_users
+        
+        forget_cached_users([obj.pk for obj in objs])
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    """UserManager whose querysets keep the session user cache in step"""
+
+
 class User(AbstractUser):
     """
     Custom user model for authentication only.
@@ -15,9 +35,19 @@ class User(AbstractUser):
     # Override email to make it optional
     email = models.EmailField(blank=True, null=True)
     
+    objects = UserManager()
+    
     def __str__(self):
         return self.username
     
+    def get_session_auth_hash(self):
+        # Users rebuilt from the user cache (users/backends.py) come without
+        # their password, but with the hash derived from it
+        cached = getattr(self, 'cached_session_auth_hash', None)
+        if cached is not None and 'password' in self.get_deferred_fields():
+            return cached
+        return super().get_session_auth_hash()
+    
     class Meta:
         db_table = 'users'
         ordering = ['-date_joined']
@@ -5,6 +5,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 
+from config.instrumentation import InstrumentedSerializerMixin
+
 User = get_user_model()
 
 
@@ -68,7 +70,7 @@ class UserLoginSerializer(serializers.Serializer):
         return attrs
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer for user profile (minimal info)"""
     class Meta:
         model = User
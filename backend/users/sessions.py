@@ -0,0 +1,23 @@
+"""
+Bulk removal of expired database sessions
+"""
+from django.contrib.sessions.models import Session
+from django.db import router
+from django.utils import timezone
+
+
+def purge_expired_sessions(batch_size=5000):
+    """
+    Delete expired rows from django_session in batches of batch_size, each
+    a single indexed DELETE. Rows are purged whatever SESSION_BACKEND is,
+    so switching to cookie or cache sessions leaves no table behind.
+    Returns the number of sessions deleted.
+    """
+    using = router.db_for_write(Session)
+    expired = Session.objects.using(using).filter(expire_date__lt=timezone.now())
+    total = 0
+    while True:
+        keys = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return total
+        total += Session.objects.using(using).filter(pk__in=keys)._raw_delete(using)
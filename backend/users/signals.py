@@ -0,0 +1,15 @@
+"""
+Signal handlers for users
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import forget_cached_users
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached session user once the change is committed"""
+    forget_cached_users([instance.pk])
@@ -0,0 +1,17 @@
+"""
+Celery tasks for users and sessions
+"""
+from celery import shared_task
+from django.conf import settings
+
+from .sessions import purge_expired_sessions as purge
+
+
+@shared_task
+def purge_expired_sessions():
+    """
+    Delete expired sessions in bulk (Django never removes them by itself)
+    """
+    count = purge(batch_size=settings.SESSION_PURGE_BATCH_SIZE)
+    
+    return f"Purged {count} expired sessions"
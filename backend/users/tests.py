@@ -0,0 +1,64 @@
+"""
+Tests for users
+"""
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .backends import CachedModelBackend, user_cache_key
+from .models import User
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, USER_CACHE_SECONDS=60)
+class CachedModelBackendTests(TestCase):
+    """The session user cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='reader-password')
+
+    def me(self):
+        return self.client.get('/api/auth/me/')
+
+    def test_failed_login_checks_the_password_once(self):
+        with mock.patch.object(User, 'check_password', autospec=True, side_effect=User.check_password) as check:
+            self.assertIsNone(authenticate(username='reader', password='wrong-password'))
+            self.assertEqual(check.call_count, 1)
+            self.assertEqual(authenticate(username='reader', password='reader-password'), self.user)
+
+    def test_cache_holds_no_password_hash(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.me().status_code, 200)
+
+        cached = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', cached['fields'])
+        self.assertNotIn(self.user.password, repr(cached))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().json()['username'], 'reader')
+
+    def test_saving_a_cached_user_keeps_the_password(self):
+        self.client.force_login(self.user)
+        self.me()
+        user = CachedModelBackend().get_user(self.user.pk)
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+
+        user.first_name = 'Renamed'
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Renamed')
+        self.assertTrue(self.user.check_password('reader-password'))
+
+    def test_queryset_update_drops_cached_users(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.me().status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.me().status_code, 403)
@@ -0,0 +1,13 @@
+#!/bin/bash
+# Hot standby of the postgres service: clone the primary on first start,
+# then follow it with streaming replication
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_basebackup -h postgres -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream; do
+        echo "Waiting for the primary..."
+        rm -rf "$PGDATA"
+        sleep 2
+    done
+    chmod 0700 "$PGDATA"
+fi
+exec postgres -c hot_standby=on